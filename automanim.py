@@ -0,0 +1,5593 @@
+from __future__ import annotations
+
+import os
+import re
+import ast
+import sys
+import json
+import io
+import hashlib
+import random
+import atexit
+import queue
+import textwrap
+import traceback
+import signal
+import itertools
+import contextlib
+import contextvars
+import shutil
+import subprocess
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+# Startup cost matters (see bench/startup.py): openai, asyncio, executors and
+# the rich modules beyond the console (Syntax pulls in pygments) are imported
+# in the functions that need them.
+from rich.console import Console, Group
+from rich.panel import Panel
+from rich.text import Text
+from rich.rule import Rule
+from rich import box
+from rich.table import Table
+import time
+
+from config import (
+    OPENROUTER_BASE_URL,
+    MODEL,
+    MODELS,
+    ESCALATE_AFTER,
+    ROUTING_MIN_TRIALS,
+    ROUTING_MIN_SUCCESS,
+    HEDGE,
+    HEDGE_DELAY,
+    MAX_HEAL_ATTEMPTS,
+    LLM_CONCURRENCY,
+    LLM_TIMEOUT,
+    LLM_CONNECT_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    HEAL_MODE,
+    PATCH_MIN_LINES,
+    CACHE_DIR,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MAX_AGE,
+    RENDER_CACHE_MAX_BYTES,
+    PARTIAL_CACHE_MAX_BYTES,
+    FIX_MEMORY_MAX_SIGNATURES,
+    FIX_MEMORY_MIN_TRIALS,
+    FIX_MEMORY_MIN_SUCCESS,
+    SCENE_LIBRARY_MAX_SCENES,
+    SCENE_VECTOR_DIM,
+    SCENE_EXAMPLES,
+    SCENE_EXAMPLE_MIN_SIMILARITY,
+    SCENE_EXAMPLE_MAX_CHARS,
+    STREAM_HEADER_LINES,
+    STREAM_PREVIEW_LINES,
+    SPECULATIVE_CANDIDATES,
+    SPECULATIVE_TEMPERATURE,
+    BATCH_OUTPUT_DIR,
+    BATCH_LLM_WORKERS,
+    RENDER_QUALITY,
+    RENDER_BACKEND,
+    RENDER_WORKERS,
+    RENDER_TIMEOUT,
+    RENDER_CPU_LIMIT,
+    RENDER_MEMORY_LIMIT,
+    MAX_SCENE_SECONDS,
+    MAX_SCENE_FRAMES,
+    RENDER_TIMEOUT_EXIT,
+    DRY_RUN_VALIDATION,
+    METRICS_DIR,
+    RENDER_PROBE_MARK,
+    FINAL_RENDER_TIMEOUT,
+    SEGMENTS,
+    SEGMENT_MIN_PLAYS,
+    ARTIFACT_DIR,
+    ARTIFACT_PRESETS,
+    ARTIFACT_BUDGET_RETRIES,
+    ARTIFACT_TIMEOUT,
+    ERROR_TOKEN_BUDGET,
+    ERROR_CONTEXT_LINES,
+    QUALITY_DIRS,
+    QUALITY_NAMES,
+)
+
+if TYPE_CHECKING:
+    import argparse
+    import asyncio
+    from concurrent.futures import Executor, ProcessPoolExecutor
+
+    from openai import AsyncOpenAI
+
+
+console = Console()
+
+SYSTEM_PROMPT = """You are an expert Manim developer. Write a complete, runnable Manim script for the requested animation.
+The script must define a Scene class named 'GenScene'. Use ONLY standard Manim Community Edition (v0.18+) classes and methods.
+Output ONLY the python code, no markdown block or explanations. Do not use ```python``` or ``````."""
+
+FIX_SYSTEM_PROMPT = """You are an expert Manim developer and debugger. You will be given a Manim script that failed to render, along with the error output.
+Your job is to fix the code so it runs without errors. Carefully analyze the traceback and error messages.
+
+Common issues to watch for:
+- Incorrect Manim API usage (wrong class names, deprecated methods, wrong arguments)
+- Syntax errors in Python code
+- LaTeX rendering issues (missing escapes, bad TeX syntax)
+- Import errors (using classes/functions that don't exist in Manim CE v0.18+)
+- Object positioning or animation issues
+- Using MathTex vs Tex incorrectly
+- Forgetting to import from manim
+
+The fixed script MUST define a Scene class named 'GenScene'.
+Output ONLY the corrected Python code, no markdown blocks or explanations. Do not use ```python``` or ``````."""
+
+PATCH_SYSTEM_PROMPT = """You are an expert Manim developer and debugger. You will be given a Manim script that failed to render, along with the error output.
+Fix it by editing only the lines that need to change. Carefully analyze the traceback and error messages.
+
+Reply with one or more SEARCH/REPLACE blocks and nothing else:
+
+<<<<<<< SEARCH
+exact lines copied from the current script
+=======
+the lines that replace them
+>>>>>>> REPLACE
+
+Rules:
+- The SEARCH part must match the current script exactly, including indentation.
+- Include just enough lines in SEARCH to make the match unique.
+- Use several small blocks rather than one large block; never repeat the whole script.
+- The script MUST keep defining a Scene class named 'GenScene'."""
+
+# ── Helpers ──────────────────────────────────────────────────────────────────
+
+
+def print_banner():
+    banner = Text()
+    banner.append(
+        "  ▄▄▄       █    ██ ▄▄▄█████▓ ▒█████      ███▄ ▄███▓ ▄▄▄       ███▄    █  ██▓ ███▄ ▄███▓\n",
+        style="bold bright_magenta",
+    )
+    banner.append(
+        "  ▒████▄     ██  ▓██▒▓  ██▒ ▓▒▒██▒  ██▒   ▓██▒▀█▀ ██▒▒████▄     ██ ▀█   █ ▓██▒▓██▒▀█▀ ██▒\n",
+        style="bold magenta",
+    )
+    banner.append(
+        "  ▒██  ▀█▄  ▓██  ▒██░▒ ▓██░ ▒░▒██░  ██▒   ▓██    ▓██░▒██  ▀█▄  ▓██  ▀█ ██▒▒██▒▓██    ▓██░\n",
+        style="bold bright_blue",
+    )
+    banner.append(
+        "  ░██▄▄▄▄██ ▓▓█  ░██░░ ▓██▓ ░ ▒██   ██░   ▒██    ▒██ ░██▄▄▄▄██ ▓██▒  ▐▌██▒░██░▒██    ▒██ \n",
+        style="bold blue",
+    )
+    banner.append(
+        "   ▓█   ▓██▒▒▒█████▓   ▒██▒ ░ ░ ████▓▒░   ▒██▒   ░██▒ ▓█   ▓██▒▒██░   ▓██░░██░▒██▒   ░██▒\n",
+        style="bold bright_cyan",
+    )
+    banner.append(
+        "   ▒▒   ▓▒█░░▒▓▒ ▒ ▒   ▒ ░░   ░ ▒░▒░▒░    ░ ▒░   ░  ░ ▒▒   ▓▒█░░ ▒░   ▒ ▒ ░▓  ░ ▒░   ░  ░\n",
+        style="bold cyan",
+    )
+
+    # Simpler, more reliable banner
+    title = Text()
+    title.append("Auto", style="bold bright_magenta")
+    title.append("Manim", style="bold bright_cyan")
+
+    subtitle = Text("  AI-powered Manim animation generator", style="dim white")
+
+    version = Text("  v0.1.0  •  powered by OpenRouter", style="dim bright_black")
+
+    console.print()
+    console.print(
+        Panel(
+            Text.assemble(
+                Text(" ✦ ", style="bold bright_magenta"),
+                Text("Auto", style="bold bright_magenta"),
+                Text("Manim", style="bold bright_cyan"),
+                Text("  ", style=""),
+                Text("AI-powered Manim animation generator", style="dim white"),
+                Text("\n"),
+                Text(
+                    "   v0.1.0  •  powered by OpenRouter  •  arcee-ai/trinity",
+                    style="dim bright_black",
+                ),
+                Text("\n"),
+                Text(
+                    f"   self-healing: up to {MAX_HEAL_ATTEMPTS} auto-fix attempts",
+                    style="dim bright_yellow",
+                ),
+            ),
+            box=box.ROUNDED,
+            border_style="bright_magenta",
+            padding=(0, 2),
+        )
+    )
+    console.print()
+
+
+def print_step(icon: str, label: str, value: str = "", style: str = "bright_cyan"):
+    report("step", icon=icon, label=label, value=value, style=style)
+
+
+def print_success(message: str):
+    report("success", message=message)
+
+
+def print_error(message: str):
+    report("error", message=message)
+
+
+def print_blank():
+    report("blank")
+
+
+def print_heal_attempt(attempt: int, max_attempts: int):
+    """Announce a healing attempt."""
+    report("heal_attempt", attempt=attempt, max_attempts=max_attempts)
+
+
+def print_heal_success(attempt: int):
+    """Announce that healing succeeded."""
+    report("heal_success", attempt=attempt)
+
+
+def print_heal_failure():
+    """Announce that every healing attempt failed."""
+    report("heal_failure", attempts=MAX_HEAL_ATTEMPTS)
+
+
+def print_error_summary(error_output: str, code: str | None = None):
+    """Report the distilled error — the same text ``fix_code`` sends the LLM."""
+    report(
+        "error_summary", summary=format_error_digest(distill_error(error_output, code))
+    )
+
+
+def print_code_preview(code: str, filename: str):
+    """Report the script about to be rendered."""
+    report("code_preview", code=code, filename=filename)
+
+
+# ── Reporting ────────────────────────────────────────────────────────────────
+
+
+class Reporter:
+    """Receives progress events from the core logic.
+
+    ``self_healing_loop`` and everything it calls describe what they are doing
+    through ``report(kind, **data)``; the current reporter decides what that
+    looks like. The CLI draws events on the terminal with ``ConsoleReporter``,
+    the server stores them with its jobs. Unknown kinds are ignored.
+    """
+
+    def emit(self, kind: str, **data):
+        handler = getattr(self, f"on_{kind}", None)
+        if handler is not None:
+            handler(**data)
+
+
+class ConsoleReporter(Reporter):
+    """Draws events on ``console`` with rich."""
+
+    def on_step(self, icon: str, label: str, value: str = "", style: str = ""):
+        line = Text()
+        line.append(f" {icon} ", style=f"bold {style}")
+        line.append(label, style="bold white")
+        if value:
+            line.append(f"  {value}", style="dim white")
+        console.print(line)
+
+    def on_success(self, message: str):
+        text = Text()
+        text.append(" ✓ ", style="bold bright_green")
+        text.append(message, style="bold white")
+        console.print(text)
+
+    def on_error(self, message: str):
+        console.print(
+            Panel(
+                Text.assemble(
+                    Text(" ✗  Error\n", style="bold bright_red"),
+                    Text(f" {message}", style="white"),
+                ),
+                border_style="bright_red",
+                box=box.ROUNDED,
+                padding=(0, 1),
+            )
+        )
+
+    def on_blank(self):
+        console.print()
+
+    def on_heal_attempt(self, attempt: int, max_attempts: int):
+        console.print()
+        console.print(
+            Panel(
+                Text.assemble(
+                    Text(" 🔧 ", style="bold bright_yellow"),
+                    Text("Self-Healing", style="bold bright_yellow"),
+                    Text(f"  attempt {attempt}/{max_attempts}", style="bold white"),
+                    Text("\n"),
+                    Text(
+                        "   Analyzing error and regenerating code…",
+                        style="dim white",
+                    ),
+                ),
+                border_style="bright_yellow",
+                box=box.ROUNDED,
+                padding=(0, 1),
+            )
+        )
+
+    def on_heal_success(self, attempt: int):
+        console.print()
+        console.print(
+            Panel(
+                Text.assemble(
+                    Text(" ✦ ", style="bold bright_green"),
+                    Text("Self-Healed!", style="bold bright_green"),
+                    Text(f"  fixed on attempt {attempt}", style="bold white"),
+                    Text("\n"),
+                    Text(
+                        "   The code was automatically repaired and rendered "
+                        "successfully.",
+                        style="dim white",
+                    ),
+                ),
+                border_style="bright_green",
+                box=box.ROUNDED,
+                padding=(0, 1),
+            )
+        )
+
+    def on_heal_failure(self, attempts: int):
+        console.print()
+        console.print(
+            Panel(
+                Text.assemble(
+                    Text(" ✗ ", style="bold bright_red"),
+                    Text("Self-Healing Failed", style="bold bright_red"),
+                    Text(f"  exhausted all {attempts} attempts", style="bold white"),
+                    Text("\n"),
+                    Text(
+                        "   Try simplifying your prompt or adjusting the description.",
+                        style="dim white",
+                    ),
+                ),
+                border_style="bright_red",
+                box=box.ROUNDED,
+                padding=(0, 1),
+            )
+        )
+
+    def on_error_summary(self, summary: str):
+        from rich.syntax import Syntax
+
+        syntax = Syntax(
+            summary,
+            "pytb",
+            theme="monokai",
+            word_wrap=True,
+            line_numbers=False,
+        )
+        console.print(
+            Panel(
+                syntax,
+                title="[bold bright_red] Error Output [/bold bright_red]",
+                title_align="left",
+                border_style="bright_red",
+                box=box.ROUNDED,
+                padding=(0, 1),
+            )
+        )
+
+    def on_code_preview(self, code: str, filename: str):
+        from rich.syntax import Syntax
+
+        lines = code.splitlines()
+        preview = "\n".join(lines[:20])
+        if len(lines) > 20:
+            preview += f"\n  … ({len(lines) - 20} more lines)"
+
+        syntax = Syntax(
+            preview, "python", theme="monokai", line_numbers=True, word_wrap=False
+        )
+        console.print(
+            Panel(
+                syntax,
+                title=f"[bold bright_black] {filename} [/bold bright_black]",
+                title_align="left",
+                border_style="bright_black",
+                box=box.ROUNDED,
+                padding=(0, 0),
+            )
+        )
+
+    def on_render_start(self, quality: str):
+        console.print()
+        console.print(Rule(style="bright_black"))
+        console.print(
+            Text.assemble(
+                Text(" ▶ ", style="bold bright_yellow"),
+                Text("Rendering scene", style="bold white"),
+                Text(f"  manim {quality} GenScene", style="dim bright_black"),
+            )
+        )
+        console.print(Rule(style="bright_black"))
+        console.print()
+
+    def on_render_output(self, stdout: str):
+        # Manim's own progress output
+        for line in stdout.strip().splitlines():
+            console.print(Text(f"  {line}", style="dim white"))
+        console.print()
+        console.print(Rule(style="bright_black"))
+
+    def on_final_render(
+        self,
+        quality: str,
+        status: str,
+        path: str,
+        elapsed: float = 0.0,
+        cached: bool = False,
+        reused: str = "",
+        pending: int = 0,
+    ):
+        ok = status == "done"
+        line = Text()
+        line.append(
+            " ✓ " if ok else " ✗ ",
+            style="bold bright_green" if ok else "bold bright_red",
+        )
+        line.append(f"{quality} render {status}", style="bold white")
+        detail = "cached" if cached else f"{elapsed:.1f}s"
+        if reused:
+            detail += f" · {reused} animations reused"
+        line.append(f"  {detail} · {path}", style="dim white")
+        if pending:
+            line.append(f"  ({pending} still rendering)", style="dim bright_black")
+        console.print(line)
+
+    def on_artifact(
+        self,
+        preset: str,
+        status: str,
+        file: str,
+        size: int = 0,
+        elapsed: float = 0.0,
+        cached: bool = False,
+        over_budget: bool = False,
+        error: str = "",
+        pending: int = 0,
+    ):
+        ok = status == "done"
+        line = Text()
+        line.append(
+            " ✓ " if ok else " ✗ ",
+            style="bold bright_green" if ok else "bold bright_red",
+        )
+        line.append(f"{preset} artifact {status}", style="bold white")
+        if ok:
+            detail = f"{size / 1024:.0f} KiB"
+            if over_budget:
+                detail += " (over budget)"
+            detail += " · cached" if cached else f" · {elapsed:.1f}s"
+            detail += f" · {file}"
+        else:
+            detail = error.strip().rsplit("\n", 1)[-1]
+        line.append(f"  {detail}", style="dim white")
+        if pending:
+            line.append(f"  ({pending} still encoding)", style="dim bright_black")
+        console.print(line)
+
+
+_reporter: contextvars.ContextVar[Reporter] = contextvars.ContextVar(
+    "automanim_reporter", default=ConsoleReporter()
+)
+
+
+def current_reporter() -> Reporter:
+    """The reporter progress events in this context go to."""
+    return _reporter.get()
+
+
+def report(kind: str, **data):
+    """Send a progress event to the current reporter."""
+    _reporter.get().emit(kind, **data)
+
+
+# ── LLM Cache ────────────────────────────────────────────────────────────────
+
+
+class LLMCache:
+    """Persistent, content-addressed cache of LLM completions.
+
+    Entries are keyed on the SHA-256 of the model name and the full message
+    list (which includes the system prompt). Each entry is one JSON file;
+    reads refresh its mtime so eviction is least-recently-used by size, and
+    entries untouched for longer than ``max_age`` seconds are dropped.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        max_age: float = LLM_CACHE_MAX_AGE,
+        enabled: bool = True,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, messages: list[dict], **params) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        """Return the cached completion for ``key``, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            age = time.time() - path.stat().st_mtime
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if age > self.max_age:
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+                self.evictions += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("content")
+
+    def put(self, key: str, model: str, content: str):
+        """Store a completion atomically, then enforce the size/age limits."""
+        if not self.enabled or not content:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(
+            json.dumps({"model": model, "created": time.time(), "content": content}),
+            encoding="utf-8",
+        )
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used until under budget."""
+        now = time.time()
+        entries = []
+        with self._lock:
+            for path in self.root.glob("*/*.json"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                    self.evictions += 1
+                else:
+                    entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        sizes = [p.stat().st_size for p in self.root.glob("*/*.json")]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+        }
+
+
+llm_cache = LLMCache(
+    CACHE_DIR / "llm",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+# ── Render Cache ─────────────────────────────────────────────────────────────
+
+
+@lru_cache(maxsize=1)
+def manim_version() -> str:
+    """Installed manim version, read from package metadata without importing it."""
+    from importlib import metadata
+
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def video_path(script_path: Path, quality: str = RENDER_QUALITY) -> Path:
+    """Where manim writes the GenScene video for ``script_path`` at ``quality``."""
+    return (
+        script_path.parent
+        / "media"
+        / "videos"
+        / script_path.stem
+        / QUALITY_DIRS[quality]
+        / "GenScene.mp4"
+    )
+
+
+class RenderCache:
+    """Persistent cache of render outcomes keyed on the validated script.
+
+    The key covers the script source, the quality flag, the installed manim
+    version and the render limits. Successful entries keep a copy of the
+    rendered MP4; failed entries keep the error output, which lets the heal
+    loop recognise a fix that reproduces a script it has already seen fail.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = RENDER_CACHE_MAX_BYTES,
+        enabled: bool = True,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(code: str, quality: str = RENDER_QUALITY) -> str:
+        payload = json.dumps(
+            {
+                "code": code,
+                "quality": quality,
+                "manim": manim_version(),
+                # Scene-length caps and resource limits decide whether a
+                # long or heavy scene fails.
+                "limits": [
+                    MAX_SCENE_SECONDS,
+                    MAX_SCENE_FRAMES,
+                    RENDER_MEMORY_LIMIT,
+                    RENDER_CPU_LIMIT,
+                ],
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> tuple[int, str, Path | None] | None:
+        """Return (returncode, output, cached_video) for ``key``, or None."""
+        if not self.enabled:
+            return None
+        entry_dir = self._dir(key)
+        try:
+            entry = json.loads((entry_dir / "result.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        video = entry_dir / "GenScene.mp4"
+        if entry["returncode"] == 0 and not video.exists():
+            # Success without its video is useless; treat it as a miss.
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(entry_dir / "result.json")
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["returncode"], entry["output"], video if video.exists() else None
+
+    def known_failure(self, code: str, quality: str = RENDER_QUALITY) -> str | None:
+        """Return the stored error output if this exact script already failed."""
+        if not self.enabled:
+            return None
+        try:
+            entry = json.loads(
+                (self._dir(self.key(code, quality)) / "result.json").read_text(
+                    encoding="utf-8"
+                )
+            )
+        except (OSError, ValueError):
+            return None
+        return entry["output"] if entry["returncode"] != 0 else None
+
+    def put(self, key: str, returncode: int, output: str, video: Path | None = None):
+        """Record a render outcome, copying the video in for successful renders."""
+        if not self.enabled:
+            return
+        entry_dir = self._dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        if returncode == 0 and video is not None:
+            tmp = entry_dir / f".GenScene.{os.getpid()}.{threading.get_ident()}.mp4"
+            shutil.copyfile(video, tmp)
+            os.replace(tmp, entry_dir / "GenScene.mp4")
+        tmp = entry_dir / f".result.{os.getpid()}.{threading.get_ident()}.json"
+        tmp.write_text(
+            json.dumps(
+                {
+                    "returncode": returncode,
+                    "output": output,
+                    "manim": manim_version(),
+                    "created": time.time(),
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, entry_dir / "result.json")
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until under ``max_bytes``."""
+        entries = []
+        with self._lock:
+            for result in self.root.glob("*/*/result.json"):
+                entry_dir = result.parent
+                try:
+                    size = sum(p.stat().st_size for p in entry_dir.iterdir())
+                    entries.append((result.stat().st_mtime, size, entry_dir))
+                except OSError:
+                    continue
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+
+
+render_cache = RenderCache(
+    CACHE_DIR / "render",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+# ── Partial Movie Cache ──────────────────────────────────────────────────────
+
+
+def partial_movie_dir(
+    script_path: Path, quality: str, media_dir: Path | None = None
+) -> Path:
+    """Where manim looks for GenScene's partial movie files for this render."""
+    media_dir = script_path.parent / "media" if media_dir is None else media_dir
+    return (
+        media_dir
+        / "videos"
+        / script_path.stem
+        / QUALITY_DIRS[quality]
+        / "partial_movie_files"
+        / "GenScene"
+    )
+
+
+class PartialMovieCache:
+    """Pool of manim partial movies shared by every render of one job.
+
+    Manim names each animation's partial movie after a hash of the play call
+    and the scene state, and skips rendering it when that file already exists
+    ("Using cached data"). Each job directory gets a stable pool per quality
+    under ``root``; ``checkout`` hard-links the pool into a render's own
+    partial-movie directory beforehand and moves new files back into it
+    afterwards. Every render process still writes to a private directory,
+    so concurrent segments and candidates can't interfere with each other.
+    Reused files are touched by the render probe, and the least recently used
+    ones are deleted once the store exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = PARTIAL_CACHE_MAX_BYTES,
+        enabled: bool = True,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.reused = 0
+        self.rendered = 0
+        self._lock = threading.Lock()
+
+    def pool(self, script_path: Path, quality: str) -> Path:
+        job = hashlib.sha256(str(script_path.parent.absolute()).encode()).hexdigest()
+        return self.root / job[:16] / QUALITY_DIRS[quality]
+
+    @staticmethod
+    def _link(source: Path, target: Path):
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            pass
+        except OSError:  # another filesystem, or no hard links
+            tmp = target.with_name(f".{target.name}.{os.getpid()}")
+            shutil.copy2(source, tmp)
+            os.replace(tmp, target)
+
+    @contextlib.contextmanager
+    def checkout(self, script_path: Path, quality: str, media_dir: Path | None = None):
+        """Seed one render's partial-movie directory and harvest it afterwards."""
+        if not self.enabled:
+            yield
+            return
+        pool = self.pool(script_path, quality)
+        work = partial_movie_dir(script_path, quality, media_dir)
+        work.mkdir(parents=True, exist_ok=True)
+        try:
+            for cached in pool.glob("*.*"):
+                if not cached.name.startswith("."):
+                    self._link(cached, work / cached.name)
+        except OSError:
+            pass
+        try:
+            yield
+        finally:
+            pool.mkdir(parents=True, exist_ok=True)
+            for produced in work.iterdir():
+                if produced.suffix in (".mp4", ".mov", ".webm"):
+                    try:
+                        self._link(produced, pool / produced.name)
+                        # Keep the newer use time when the pool holds a copy.
+                        used = produced.stat().st_mtime
+                        if (pool / produced.name).stat().st_mtime < used:
+                            os.utime(pool / produced.name, (used, used))
+                    except OSError:
+                        continue
+                produced.unlink(missing_ok=True)
+            self.evict()
+
+    def record(self, probe: dict):
+        """Count the animations a render reused and rendered, from its probe."""
+        with self._lock:
+            self.reused += probe.get("reused", 0)
+            self.rendered += probe.get("animations", 0) - probe.get("reused", 0)
+
+    def evict(self):
+        """Remove the least recently used partial movies until under ``max_bytes``."""
+        with self._lock:
+            files = []
+            for path in self.root.glob("*/*/*"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def size(self) -> int:
+        return sum(
+            path.stat().st_size for path in self.root.glob("*/*/*") if path.is_file()
+        )
+
+
+partial_movies = PartialMovieCache(
+    CACHE_DIR / "partial_movies",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+# ── Metrics ──────────────────────────────────────────────────────────────────
+
+
+def _escape_label(value) -> str:
+    """Escape an OpenMetrics label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunMetrics:
+    """Wall-clock and CPU time per stage of one run, plus LLM token usage.
+
+    Stages are recorded as individual samples (a run renders and heals
+    several times) through ``timed``/``record_stage``, which write to the
+    run bound to the current context. Thread pools that work for a run are
+    handed a copy of the submitting context so their samples land here too.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, run_id: str | None = None, **labels):
+        self.run_id = run_id or (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._ids)}"
+        )
+        self.labels = labels
+        self.started = time.time()
+        self.wall = None
+        self.success = None
+        self.stages: list[dict] = []
+        self.tokens = {"prompt": 0, "completion": 0, "total": 0}
+        self.llm_calls = 0
+        self.llm_cached = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, wall: float, cpu: float = 0.0, **labels):
+        with self._lock:
+            self.stages.append(
+                {"stage": stage, "wall": round(wall, 4), "cpu": round(cpu, 4), **labels}
+            )
+
+    def add_usage(self, usage, cached: bool = False):
+        """Count one LLM call and add its OpenAI ``usage`` object, if any."""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_cached += cached
+            if usage is None:
+                return
+            self.tokens["prompt"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.tokens["completion"] += getattr(usage, "completion_tokens", 0) or 0
+            self.tokens["total"] += getattr(usage, "total_tokens", 0) or 0
+
+    def finish(self, success: bool | None = None):
+        if success is not None:
+            self.success = success
+        self.wall = round(time.time() - self.started, 4)
+
+    def summary(self) -> dict:
+        """Per-stage totals: ``{stage: {count, wall, cpu}}`` plus tokens."""
+        stages: dict[str, dict] = {}
+        with self._lock:
+            for sample in self.stages:
+                total = stages.setdefault(
+                    sample["stage"], {"count": 0, "wall": 0.0, "cpu": 0.0}
+                )
+                total["count"] += 1
+                total["wall"] = round(total["wall"] + sample["wall"], 4)
+                total["cpu"] = round(total["cpu"] + sample["cpu"], 4)
+        return {"stages": stages, "tokens": dict(self.tokens)}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "run": self.run_id,
+                "labels": self.labels,
+                "model": MODELS,
+                "started": self.started,
+                "wall": self.wall,
+                "success": self.success,
+                "tokens": dict(self.tokens),
+                "llm": {"calls": self.llm_calls, "cached": self.llm_cached},
+                "stages": list(self.stages),
+            }
+
+    def to_openmetrics(self) -> str:
+        """The run's totals in the OpenMetrics text exposition format."""
+
+        def labels(**extra) -> str:
+            values = {"run": self.run_id, **self.labels, **extra}
+            return ",".join(f'{k}="{_escape_label(v)}"' for k, v in values.items())
+
+        summary = self.summary()
+        lines = []
+        for name, key, unit, help_text in (
+            ("automanim_stage_seconds", "wall", "seconds", "Wall-clock time."),
+            ("automanim_stage_cpu_seconds", "cpu", "seconds", "CPU time per stage."),
+            ("automanim_stage_calls", "count", None, "Times each stage ran."),
+        ):
+            lines.append(f"# TYPE {name} counter")
+            if unit:
+                lines.append(f"# UNIT {name} {unit}")
+            lines.append(f"# HELP {name} {help_text}")
+            for stage, totals in summary["stages"].items():
+                lines.append(f"{name}_total{{{labels(stage=stage)}}} {totals[key]}")
+        lines.append("# TYPE automanim_llm_tokens counter")
+        lines.append("# HELP automanim_llm_tokens LLM tokens used.")
+        for kind, count in summary["tokens"].items():
+            lines.append(f"automanim_llm_tokens_total{{{labels(kind=kind)}}} {count}")
+        lines.append("# TYPE automanim_run_seconds gauge")
+        lines.append("# UNIT automanim_run_seconds seconds")
+        lines.append(f"automanim_run_seconds{{{labels()}}} {self.wall or 0}")
+        lines.append("# TYPE automanim_run_success gauge")
+        lines.append(f"automanim_run_success{{{labels()}}} {int(bool(self.success))}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: Path = METRICS_DIR) -> Path:
+        """Write ``<run>.json`` and ``<run>.prom`` into ``directory``."""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.run_id}.json"
+        for target, content in (
+            (path, json.dumps(self.to_dict(), indent=2)),
+            (path.with_suffix(".prom"), self.to_openmetrics()),
+        ):
+            tmp = target.with_name(f".{target.name}.tmp")
+            tmp.write_text(content, encoding="utf-8")
+            os.replace(tmp, target)
+        return path
+
+
+_current_run: contextvars.ContextVar[RunMetrics | None] = contextvars.ContextVar(
+    "automanim_run", default=None
+)
+
+
+def current_run() -> RunMetrics | None:
+    return _current_run.get()
+
+
+@contextlib.contextmanager
+def timed(stage: str, **labels):
+    """Record the enclosed block as a ``stage`` sample of the current run.
+
+    Yields a dict for labels known only inside the block; a ``child_cpu``
+    entry (CPU used by a render subprocess) is added to the sample's CPU.
+    """
+    sample: dict = {}
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield sample
+    finally:
+        run = _current_run.get()
+        if run is not None:
+            child_cpu = sample.pop("child_cpu", 0.0) or 0.0
+            run.record(
+                stage,
+                time.perf_counter() - wall,
+                time.thread_time() - cpu + child_cpu,
+                **labels,
+                **sample,
+            )
+
+
+def record_stage(
+    stage: str, wall: float, cpu: float = 0.0, run: RunMetrics | None = None, **labels
+):
+    """Record a sample measured elsewhere, e.g. inside a render process."""
+    run = run or _current_run.get()
+    if run is not None:
+        run.record(stage, wall, cpu, **labels)
+
+
+def _install_render_probes(mark: str | None = None) -> dict:
+    """Time manim's movie encoding in the current render process.
+
+    Wraps the ``SceneFileWriter`` methods that feed and finalise the encoder
+    and accumulates their wall time in the returned dict, along with the
+    number of animations the scene played and how many of them manim found in
+    its partial-movie cache. With ``mark``, the totals and the CPU time of the
+    process and its children (ffmpeg) are printed to stderr as ``mark`` + JSON
+    when the process exits.
+
+    Kept self-contained because its source is also run in manim subprocesses.
+    """
+    import atexit
+    import json
+    import os
+    import sys
+    import time
+    from pathlib import Path
+
+    from manim.scene.scene_file_writer import SceneFileWriter
+
+    totals = getattr(SceneFileWriter, "_automanim_probes", None)
+    if totals is None:
+        totals = {"encode": 0.0}
+
+        def timed(method):
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    totals["encode"] += time.perf_counter() - start
+
+            return wrapper
+
+        for name in (
+            "write_frame",
+            "close_partial_movie_stream",
+            "combine_to_movie",
+            "combine_to_section_videos",
+        ):
+            if hasattr(SceneFileWriter, name):
+                setattr(SceneFileWriter, name, timed(getattr(SceneFileWriter, name)))
+        SceneFileWriter._automanim_probes = totals
+
+        if hasattr(SceneFileWriter, "is_already_cached"):
+            original_is_cached = SceneFileWriter.is_already_cached
+
+            def is_already_cached(self, hash_invocation):
+                cached = original_is_cached(self, hash_invocation)
+                totals["animations"] = totals.get("animations", 0) + 1
+                if cached:
+                    totals["reused"] = totals.get("reused", 0) + 1
+                    # Mark the partial movie as recently used for the LRU.
+                    for path in Path(self.partial_movie_directory).glob(
+                        f"{hash_invocation}.*"
+                    ):
+                        os.utime(path)
+                return cached
+
+            SceneFileWriter.is_already_cached = is_already_cached
+
+        from manim.scene.scene import Scene
+
+        original_render = Scene.render
+
+        def render(self, *args, **kwargs):
+            # play()/wait() calls, as numbered by `manim -n`.
+            try:
+                return original_render(self, *args, **kwargs)
+            finally:
+                totals["plays"] = self.renderer.num_plays
+
+        Scene.render = render
+
+    if mark is not None:
+
+        def report():
+            try:
+                import resource
+
+                cpu = sum(
+                    usage.ru_utime + usage.ru_stime
+                    for usage in (
+                        resource.getrusage(resource.RUSAGE_SELF),
+                        resource.getrusage(resource.RUSAGE_CHILDREN),
+                    )
+                )
+            except ImportError:  # not available on Windows
+                cpu = time.process_time()
+            sys.stderr.write(f"\n{mark}{json.dumps({**totals, 'cpu': cpu})}\n")
+            sys.stderr.flush()
+
+        atexit.register(report)
+    return totals
+
+
+def _process_cpu() -> float:
+    """CPU seconds used by this process and its waited-for children."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return time.process_time()
+    return sum(
+        usage.ru_utime + usage.ru_stime
+        for usage in (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+    )
+
+
+def _split_probe(stderr: str) -> tuple[str, dict | None]:
+    """Remove the render probe line from ``stderr``; returns (stderr, totals)."""
+    match = re.search(rf"^{re.escape(RENDER_PROBE_MARK)}(.*)\n?", stderr, re.M)
+    if match is None:
+        return stderr, None
+    try:
+        probe = json.loads(match.group(1))
+    except ValueError:
+        probe = None
+    return stderr[: match.start()] + stderr[match.end() :], probe
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def aggregate_metrics(runs: list[dict]) -> dict:
+    """Summarise ``RunMetrics.to_dict`` records across many runs."""
+    samples: dict[str, list[dict]] = {}
+    for run in runs:
+        for sample in run["stages"]:
+            samples.setdefault(sample["stage"], []).append(sample)
+    walls = [run["wall"] for run in runs if run.get("wall") is not None]
+    return {
+        "runs": len(runs),
+        "succeeded": sum(bool(run.get("success")) for run in runs),
+        "wall": {
+            "total": round(sum(walls), 3),
+            "p50": _percentile(walls, 0.5),
+            "p95": _percentile(walls, 0.95),
+        },
+        "tokens": {
+            kind: sum(run["tokens"].get(kind, 0) for run in runs)
+            for kind in ("prompt", "completion", "total")
+        },
+        "llm": {
+            "calls": sum(run["llm"]["calls"] for run in runs),
+            "cached": sum(run["llm"]["cached"] for run in runs),
+        },
+        "stages": {
+            stage: {
+                "count": len(items),
+                "wall": round(sum(i["wall"] for i in items), 3),
+                "cpu": round(sum(i["cpu"] for i in items), 3),
+                "p50": _percentile([i["wall"] for i in items], 0.5),
+                "p95": _percentile([i["wall"] for i in items], 0.95),
+            }
+            for stage, items in sorted(samples.items())
+        },
+    }
+
+
+def load_metrics(directory: Path = METRICS_DIR) -> list[dict]:
+    """Read every run record written to ``directory``."""
+    runs = []
+    for path in sorted(directory.glob("*.json")):
+        try:
+            runs.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return runs
+
+
+# ── Render Limits ────────────────────────────────────────────────────────────
+
+
+def render_limits() -> dict:
+    """Current limits as a picklable dict for manim subprocesses and workers."""
+    return {
+        "memory": RENDER_MEMORY_LIMIT * 1024 * 1024,
+        "cpu": RENDER_CPU_LIMIT,
+        "scene_seconds": MAX_SCENE_SECONDS,
+        "scene_frames": MAX_SCENE_FRAMES,
+    }
+
+
+def _install_render_limits(limits: dict):
+    """Apply resource limits and the scene-length cap to the current process.
+
+    Memory is capped with RLIMIT_AS and CPU time with RLIMIT_CPU, counted from
+    the CPU already used so a long-lived worker gets a fresh budget per job.
+    ``Scene.get_run_time`` is wrapped so a ``play``/``wait`` that would push
+    the scene past ``scene_seconds`` (or ``scene_frames``) raises before any
+    of its frames are rendered.
+
+    Kept self-contained because its source is also run in manim subprocesses.
+    """
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        resource = None
+
+    if resource is not None:
+        if limits.get("memory"):
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            memory = limits["memory"]
+            if hard != resource.RLIM_INFINITY:
+                memory = min(memory, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (memory, hard))
+        if limits.get("cpu"):
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            cpu = int(usage.ru_utime + usage.ru_stime) + limits["cpu"]
+            if hard != resource.RLIM_INFINITY:
+                cpu = min(cpu, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu, hard))
+
+    from manim import config
+    from manim.scene.scene import Scene
+
+    if not hasattr(Scene, "_automanim_limits"):
+        original_get_run_time = Scene.get_run_time
+
+        class SceneLimitExceeded(RuntimeError):
+            pass
+
+        SceneLimitExceeded.__qualname__ = "SceneLimitExceeded"
+
+        def get_run_time(self, animations):
+            run_time = original_get_run_time(self, animations)
+            limits = Scene._automanim_limits
+            max_seconds = limits.get("scene_seconds") or float("inf")
+            if limits.get("scene_frames"):
+                max_seconds = min(
+                    max_seconds, limits["scene_frames"] / config.frame_rate
+                )
+            if self.renderer.time + run_time > max_seconds:
+                raise SceneLimitExceeded(
+                    f"the scene would run to {self.renderer.time + run_time:.1f}s, "
+                    f"over the {max_seconds:g}s limit on total animation length. "
+                    "Shorten run_time/wait() durations or split the animation."
+                )
+            return run_time
+
+        Scene.get_run_time = get_run_time
+    Scene._automanim_limits = limits
+
+
+@lru_cache(maxsize=1)
+def _manim_bootstrap() -> str:
+    """``python -c`` source that installs the render limits and probes, then runs
+    manim's CLI."""
+    import inspect
+
+    return (
+        inspect.getsource(_install_render_limits)
+        + "\n"
+        + inspect.getsource(_install_render_probes)
+        + "\nimport json, sys, runpy\n"
+        + "_install_render_limits(json.loads(sys.argv.pop(1)))\n"
+        + f"_install_render_probes({RENDER_PROBE_MARK!r})\n"
+        + "runpy.run_module('manim', run_name='__main__', alter_sys=True)\n"
+    )
+
+
+def render_limit_message(kind: str, limit: float) -> str:
+    """Structured explanation of a limit breach, phrased for ``fix_code``."""
+    if kind == "timeout":
+        headline = (
+            f"RenderTimeout: rendering was stopped after the {limit:g}s "
+            "wall-clock limit."
+        )
+    elif kind == "cpu":
+        headline = f"RenderLimit: rendering used more than {limit:g}s of CPU time."
+    else:
+        headline = "Render cancelled."
+        return headline
+    return (
+        f"{headline}\n"
+        "The scene is probably far too long or never finishes: look for wait() "
+        "or run_time values that are very large, updaters or always_redraw "
+        "objects doing heavy work every frame, or loops in construct() that "
+        f"never end. Keep the whole animation under {MAX_SCENE_SECONDS:g}s."
+    )
+
+
+def _kill_process_tree(pid: int):
+    """Kill ``pid`` and everything in its process group (LaTeX, ffmpeg, …)."""
+    try:
+        if os.name == "posix":
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _limit_breach(returncode: int) -> str | None:
+    """Name the limit a process was killed for, judging by its exit status."""
+    if os.name == "posix" and returncode == -signal.SIGXCPU:
+        return "cpu"
+    return None
+
+
+# ── Render Worker ────────────────────────────────────────────────────────────
+
+
+def _render_in_process(job: dict) -> tuple[int, str, str]:
+    """Render one script inside the current (manim-importing) process.
+
+    The script is executed in a fresh namespace and its ``GenScene`` rendered
+    under a temporary manim config, so nothing leaks between jobs. Output that
+    manim would print is captured and returned like a subprocess's would be.
+    """
+    from manim import tempconfig
+    from manim.constants import QUALITIES
+
+    script_path = Path(job["script_path"]).absolute()
+    quality = QUALITIES[QUALITY_NAMES[job["quality"]]]
+    settings = {
+        "pixel_height": quality["pixel_height"],
+        "pixel_width": quality["pixel_width"],
+        "frame_rate": quality["frame_rate"],
+        "media_dir": str(script_path.parent / "media"),
+        "input_file": str(script_path),
+    }
+    if job.get("dry_run"):
+        # Same effect as `manim -s`: skip animations, no movie, last frame only.
+        settings.update(save_last_frame=True, write_to_movie=False)
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    probes = {"encode": 0.0}
+    cpu_start = _process_cpu()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            _install_render_limits(job.get("limits", {}))
+            probes = _install_render_probes()
+            probes["encode"] = 0.0
+            for key in ("plays", "animations", "reused"):
+                probes.pop(key, None)
+            with tempconfig(settings):
+                namespace = {"__name__": script_path.stem, "__file__": str(script_path)}
+                exec(compile(job["source"], str(script_path), "exec"), namespace)
+                if "GenScene" not in namespace:
+                    raise NameError("Script does not define a 'GenScene' class.")
+                namespace["GenScene"]().render()
+        except Exception:
+            returncode = 1
+            stderr.write(traceback.format_exc())
+    # Same report a manim subprocess prints on exit, for this job only.
+    probe = {**probes, "cpu": _process_cpu() - cpu_start}
+    stderr.write(f"\n{RENDER_PROBE_MARK}{json.dumps(probe)}\n")
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+def _render_worker_main(conn):
+    """Worker process loop: import manim once, then render jobs from ``conn``."""
+    import manim  # noqa: F401 — the expensive import this worker exists to amortise
+
+    if os.name == "posix":
+        # Own process group, so killing the worker also kills LaTeX/ffmpeg.
+        os.setsid()
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        conn.send(_render_in_process(job))
+
+
+class RenderWorker:
+    """Parent-side handle on one long-lived render worker process.
+
+    The worker is started lazily and restarted after it crashes, times out or
+    is cancelled, so one bad script can't take later renders down with it.
+    """
+
+    def __init__(self):
+        self._proc = None
+        self._conn = None
+
+    def _start(self):
+        import multiprocessing
+
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._proc = ctx.Process(
+            target=_render_worker_main, args=(child_conn,), daemon=True
+        )
+        self._proc.start()
+        child_conn.close()
+
+    def _kill(self):
+        if self._proc is not None:
+            _kill_process_tree(self._proc.pid)
+            self._proc.kill()
+            self._proc.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._proc = self._conn = None
+
+    def render(
+        self,
+        script_path: Path,
+        quality: str = RENDER_QUALITY,
+        cancel: threading.Event | None = None,
+        dry_run: bool = False,
+        limits: dict | None = None,
+        timeout: float | None = None,
+    ) -> tuple[int, str, str]:
+        """Render ``script_path``; returns (returncode, stdout, stderr)."""
+        if self._proc is None or not self._proc.is_alive():
+            self._start()
+
+        limits = render_limits() if limits is None else limits
+        timeout = RENDER_TIMEOUT if timeout is None else timeout
+        self._conn.send(
+            {
+                "source": script_path.read_text(encoding="utf-8"),
+                "script_path": str(script_path.absolute()),
+                "quality": quality,
+                "dry_run": dry_run,
+                "limits": limits,
+            }
+        )
+        deadline = time.monotonic() + timeout if timeout else None
+        while not self._conn.poll(0.2):
+            if cancel is not None and cancel.is_set():
+                self._kill()
+                return -signal.SIGKILL, "", render_limit_message("cancel", 0)
+            if deadline is not None and time.monotonic() > deadline:
+                self._kill()
+                return (
+                    RENDER_TIMEOUT_EXIT,
+                    "",
+                    render_limit_message("timeout", timeout),
+                )
+            if not self._proc.is_alive():
+                break
+
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError):
+            self._proc.join()
+            exitcode = self._proc.exitcode
+            self._kill()
+            if _limit_breach(exitcode) == "cpu":
+                return exitcode, "", render_limit_message("cpu", limits["cpu"])
+            return (
+                exitcode if exitcode else -1,
+                "",
+                f"Render worker crashed (exit code {exitcode}).",
+            )
+
+    def close(self):
+        if self._proc is not None and self._proc.is_alive():
+            try:
+                self._conn.send(None)
+                self._proc.join(timeout=5)
+            except OSError:
+                pass
+        self._kill()
+
+
+class RenderWorkerPool:
+    """Small pool of ``RenderWorker``s; each render borrows an idle worker."""
+
+    def __init__(self, size: int = RENDER_WORKERS):
+        self.workers = [RenderWorker() for _ in range(max(1, size))]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def render(
+        self,
+        script_path: Path,
+        quality: str = RENDER_QUALITY,
+        cancel: threading.Event | None = None,
+        dry_run: bool = False,
+        limits: dict | None = None,
+        timeout: float | None = None,
+    ) -> tuple[int, str, str]:
+        worker = self._idle.get()
+        try:
+            return worker.render(script_path, quality, cancel, dry_run, limits, timeout)
+        finally:
+            self._idle.put(worker)
+
+    def start(self):
+        """Start every worker now instead of on its first render."""
+        for worker in self.workers:
+            if worker._proc is None or not worker._proc.is_alive():
+                worker._start()
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+_render_workers: RenderWorkerPool | None = None
+_render_workers_lock = threading.Lock()
+
+
+def get_render_workers(size: int | None = None) -> RenderWorkerPool:
+    """Return the process-wide render worker pool, creating it on first use."""
+    global _render_workers
+    with _render_workers_lock:
+        if _render_workers is None:
+            _render_workers = RenderWorkerPool(size or RENDER_WORKERS)
+            atexit.register(_render_workers.close)
+        return _render_workers
+
+
+# ── Error Distillation ───────────────────────────────────────────────────────
+
+_ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+# `File "x.py", line 7, in construct` (plain) or `│ x.py:7 in construct` (rich).
+_PLAIN_FRAME = re.compile(
+    r'^\s*File "(?P<path>[^"]+)", line (?P<line>\d+), in (?P<func>\S+)'
+)
+_RICH_FRAME = re.compile(r"^[│|]?\s*(?P<path>\S+\.py):(?P<line>\d+) in (?P<func>\S+)")
+_EXCEPTION = re.compile(
+    r"^(?P<type>[A-Za-z_][\w.]*"
+    r"(?:Error|Exception|Exceeded|Exit|Interrupt|Timeout|Limit))"
+    r"(?::\s*(?P<message>.*))?$"
+)
+# manim's rich log lines: `[10/18/26 12:00:00] INFO     Animation 0 : ...`.
+_LOG_LINE = re.compile(
+    r"^(?:\[[\d/: ]+\]\s*)?"
+    r"(?P<level>DEBUG|INFO|WARNING|ERROR|CRITICAL)\b\s*(?P<text>.*)"
+)
+_PROGRESS = re.compile(r"\d+%\|.*\||\d+(?:\.\d+)?\s*it/s|^\s*Manim Community v")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for prompt budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _is_script_frame(path: str) -> bool:
+    """True for traceback frames in the generated script, not manim or stdlib."""
+    if path.startswith("<") or not path.endswith(".py"):
+        return False
+    return not any(
+        part in path for part in ("site-packages", "dist-packages", "/lib/python")
+    )
+
+
+def _strip_noise(output: str) -> list[str]:
+    """Drop ANSI codes, progress bars, box drawing and non-error log lines."""
+    lines = []
+    for raw in _ANSI.sub("", output).replace("\r", "\n").splitlines():
+        line = raw.rstrip()
+        stripped = line.strip("│╭╮╰╯─ ")
+        if not stripped or _PROGRESS.search(line):
+            continue
+        log = _LOG_LINE.match(line)
+        if log:
+            if log["level"] in ("DEBUG", "INFO"):
+                continue
+            line = f"{log['level']}: {log['text'].strip()}"
+        lines.append(line)
+    return lines
+
+
+def distill_error(output: str, code: str | None = None) -> dict:
+    """
+    Parse raw render output into a compact record: exception type and message,
+    the traceback frames that point into the generated script, the offending
+    source lines (with context, when ``code`` is given) and any error-level
+    log lines, e.g. LaTeX failures.
+    """
+    lines = _strip_noise(output)
+    frames = []
+    exception, message = None, None
+    log, notes = [], []
+    for line in lines:
+        text = line.strip("│ ")
+        frame = _PLAIN_FRAME.match(text) or _RICH_FRAME.match(text)
+        if frame:
+            entry = {"line": int(frame["line"]), "function": frame["func"]}
+            if _is_script_frame(frame["path"]) and entry not in frames:
+                frames.append(entry)
+            continue
+        found = _EXCEPTION.match(text)
+        if found:
+            exception, message = found["type"], (found["message"] or "").strip()
+            notes = []
+        elif text.startswith(("WARNING:", "ERROR:", "CRITICAL:", "! ", "-> ")):
+            log.append(text)
+        elif exception is not None and len(notes) < 6:
+            # Lines after the exception (limit explanations, wrapped messages).
+            notes.append(text)
+
+    source = []
+    code_lines = code.splitlines() if code else []
+    for frame in frames:
+        if not code_lines or not 1 <= frame["line"] <= len(code_lines):
+            continue
+        start = max(1, frame["line"] - ERROR_CONTEXT_LINES)
+        end = min(len(code_lines), frame["line"] + ERROR_CONTEXT_LINES)
+        source.append(
+            "\n".join(
+                f"{'>' if n == frame['line'] else ' '} {n:4d} | {code_lines[n - 1]}"
+                for n in range(start, end + 1)
+            )
+        )
+
+    return {
+        "exception": exception,
+        "message": message,
+        "frames": frames,
+        "source": source,
+        "log": list(dict.fromkeys(log)),
+        "notes": notes,
+        # Unparsed output (validator reports, limit messages) is kept as-is.
+        "tail": [] if exception else lines,
+    }
+
+
+def format_error_digest(digest: dict, budget: int = ERROR_TOKEN_BUDGET) -> str:
+    """Render a ``distill_error`` record as prompt text within ``budget`` tokens."""
+    max_chars = budget * 4
+    if digest["exception"] is None:
+        text = "\n".join(digest["tail"])
+        if len(text) > max_chars:
+            # Keep the end: the actual failure is reported last.
+            text = "…\n" + text[-max_chars:].split("\n", 1)[-1]
+        return text
+
+    head = digest["exception"] + (f": {digest['message']}" if digest["message"] else "")
+    parts = [head[:max_chars]]
+    if digest["notes"]:
+        parts.append("\n".join(digest["notes"]))
+    if digest["frames"]:
+        # Innermost frame last, as in a Python traceback.
+        parts.append(
+            "Traceback in the generated script:\n"
+            + "\n".join(
+                f"  line {f['line']}, in {f['function']}" for f in digest["frames"]
+            )
+        )
+    # Innermost frame's source first so it survives the budget cut.
+    parts.extend(reversed(digest["source"]))
+    if digest["log"]:
+        parts.append("Log output:\n" + "\n".join(digest["log"]))
+
+    text = ""
+    for part in parts:
+        candidate = f"{text}\n\n{part}" if text else part
+        if len(candidate) > max_chars:
+            break
+        text = candidate
+    return text
+
+
+# ── Patch Heals ──────────────────────────────────────────────────────────────
+
+_SEARCH_REPLACE = re.compile(
+    r"^<{5,}[ \t]*SEARCH[^\n]*\n(.*?)^={5,}[^\n]*\n(.*?)^>{5,}[ \t]*REPLACE",
+    re.S | re.M,
+)
+
+
+def parse_patch(text: str) -> list[tuple[str, str]]:
+    """
+    Extract (search, replace) edits from a patch reply. SEARCH/REPLACE blocks
+    are preferred; a unified diff is accepted too, one edit per hunk.
+    """
+    edits = [(m.group(1), m.group(2)) for m in _SEARCH_REPLACE.finditer(text)]
+    if edits:
+        return edits
+
+    search, replace, in_hunk = [], [], False
+    for line in text.splitlines():
+        if line.startswith("@@") or line.startswith(("--- ", "+++ ", "```")):
+            if search or replace:
+                edits.append(("\n".join(search) + "\n", "\n".join(replace) + "\n"))
+            search, replace = [], []
+            in_hunk = line.startswith("@@")
+        elif not in_hunk or line.startswith("\\"):
+            continue
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        else:
+            # Context line; models often drop the leading space of blank lines.
+            search.append(line[1:] if line.startswith(" ") else line)
+            replace.append(search[-1])
+    if search or replace:
+        edits.append(("\n".join(search) + "\n", "\n".join(replace) + "\n"))
+    return edits
+
+
+def _find_lines(text: str, block: str) -> list[int]:
+    """Offsets of every occurrence of ``block`` spanning whole lines."""
+    found = []
+    start = text.find(block)
+    while start != -1:
+        end = start + len(block)
+        if (start == 0 or text[start - 1] == "\n") and (
+            block.endswith("\n") or end == len(text) or text[end] == "\n"
+        ):
+            found.append(start)
+        start = text.find(block, start + 1)
+    return found
+
+
+def apply_patch(code: str, edits: list[tuple[str, str]]) -> str | None:
+    """
+    Apply ``edits`` to ``code`` in order. Each search text must match whole
+    lines of the code exactly once, exactly or ignoring trailing whitespace;
+    returns None if any edit doesn't apply, is ambiguous or the patch
+    changes nothing.
+    """
+    patched = code
+    for search, replace in edits:
+        if not search.strip():
+            return None
+        block = search.rstrip("\n")
+        found = _find_lines(patched, block)
+        if len(found) > 1:
+            return None
+        if found:
+            start, end = found[0], found[0] + len(block)
+            new = replace.rstrip("\n")
+            # Replace the line break too unless the block is the last line.
+            if search.endswith("\n") and patched.startswith("\n", end):
+                end, new = end + 1, replace
+            patched = patched[:start] + new + patched[end:]
+            continue
+        lines = patched.splitlines(keepends=True)
+        wanted = [line.rstrip() for line in search.splitlines()]
+        found = [
+            start
+            for start in range(len(lines) - len(wanted) + 1)
+            if [line.rstrip() for line in lines[start : start + len(wanted)]] == wanted
+        ]
+        if len(found) != 1:
+            return None
+        start, end = found[0], found[0] + len(wanted)
+        new_lines = replace.splitlines(keepends=True)
+        if new_lines:
+            # Keep the newline (or its absence) after the replaced block.
+            new_lines[-1] = new_lines[-1].rstrip("\r\n") + (
+                "\n" if lines[end - 1].endswith("\n") else ""
+            )
+        lines[start:end] = new_lines
+        patched = "".join(lines)
+    return patched if patched != code else None
+
+
+# ── Model Routing ────────────────────────────────────────────────────────────
+
+
+def parse_model_tiers(spec: str) -> list[list[str]]:
+    """``"fast-a|fast-b,strong"`` → [["fast-a", "fast-b"], ["strong"]]."""
+    tiers = [
+        [model.strip() for model in tier.split("|") if model.strip()]
+        for tier in spec.split(",")
+    ]
+    return [tier for tier in tiers if tier] or [[MODEL]]
+
+
+class ModelStats:
+    """Per-model latency and success record that routing decisions are based on.
+
+    ``record`` is called for every completed request (latency, and whether it
+    returned a usable answer); ``record_outcome`` once a model's script has
+    been validated or rendered. The store is one JSON file keeping the last
+    ``window`` latencies per model.
+    """
+
+    def __init__(self, path: Path, window: int = 100, enabled: bool = True):
+        self.path = path
+        self.window = window
+        self.enabled = enabled
+        self._models: dict | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._models is None:
+            try:
+                self._models = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._models = {}
+        return self._models
+
+    def _save(self):
+        if not self.enabled:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(
+            f".{self.path.name}.{os.getpid()}.{threading.get_ident()}"
+        )
+        tmp.write_text(json.dumps(self._load(), indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _entry(self, model: str) -> dict:
+        return self._load().setdefault(
+            model,
+            {
+                "requests": 0,
+                "valid": 0,
+                "hedge_wins": 0,
+                "scripts": 0,
+                "passed": 0,
+                "latencies": [],
+            },
+        )
+
+    def record(self, model: str, latency: float, valid: bool):
+        with self._lock:
+            entry = self._entry(model)
+            entry["requests"] += 1
+            entry["valid"] += valid
+            entry["latencies"] = entry["latencies"][-(self.window - 1) :] + [
+                round(latency, 3)
+            ]
+            self._save()
+
+    def record_hedge_win(self, model: str):
+        with self._lock:
+            self._entry(model)["hedge_wins"] += 1
+            self._save()
+
+    def record_outcome(self, model: str, passed: bool):
+        """Count a script written by ``model`` as passing or failing."""
+        with self._lock:
+            entry = self._entry(model)
+            entry["scripts"] += 1
+            entry["passed"] += passed
+            self._save()
+
+    def success_rate(self, model: str) -> float:
+        """Share of usable answers times the share of passing scripts.
+
+        Both shares are Laplace-smoothed, so a new model starts at 1/4.
+        """
+        with self._lock:
+            entry = self._load().get(model)
+        if entry is None:
+            return 0.25
+        valid = (entry["valid"] + 1) / (entry["requests"] + 2)
+        return valid * (entry["passed"] + 1) / (entry["scripts"] + 2)
+
+    def trials(self, model: str) -> int:
+        with self._lock:
+            return self._load().get(model, {}).get("scripts", 0)
+
+    def latency(self, model: str, q: float = 0.5) -> float | None:
+        """The ``q`` quantile of recent latencies, None before ROUTING_MIN_TRIALS."""
+        with self._lock:
+            latencies = self._load().get(model, {}).get("latencies", [])
+        if len(latencies) < ROUTING_MIN_TRIALS:
+            return None
+        return _percentile(latencies, q)
+
+    def rank(self, models: list[str]) -> list[str]:
+        """Order ``models`` by expected seconds per passing script.
+
+        Models without enough history sort first, so every model in a tier
+        gets tried before the ranking settles.
+        """
+
+        def cost(model: str) -> float:
+            latency = self.latency(model)
+            if latency is None:
+                return -1.0
+            return latency / self.success_rate(model)
+
+        return sorted(models, key=cost)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "requests": entry["requests"],
+                    "scripts": entry["scripts"],
+                    "passed": entry["passed"],
+                    "hedge_wins": entry["hedge_wins"],
+                    "p50": _percentile(entry["latencies"], 0.5),
+                    "p95": _percentile(entry["latencies"], 0.95),
+                }
+                for model, entry in self._load().items()
+            }
+
+
+model_stats = ModelStats(
+    CACHE_DIR / "model_stats.json",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+def route_models(failed_heals: int = 0) -> list[str]:
+    """Models to ask, best first, after ``failed_heals`` failed heal attempts.
+
+    The tier is chosen by ``ESCALATE_AFTER``, skipping tiers whose models have
+    all proven unreliable. The first entry is the model to use; the second,
+    if any, is the hedge — the runner-up in the same tier, or the best model
+    of the next tier when the tier has only one.
+    """
+    tiers = parse_model_tiers(MODELS)
+    tier = min(failed_heals // max(1, ESCALATE_AFTER), len(tiers) - 1)
+    while tier < len(tiers) - 1 and all(
+        model_stats.trials(model) >= ROUTING_MIN_TRIALS
+        and model_stats.success_rate(model) < ROUTING_MIN_SUCCESS
+        for model in tiers[tier]
+    ):
+        tier += 1
+    models = model_stats.rank(tiers[tier])
+    if len(models) == 1 and tier + 1 < len(tiers):
+        models += model_stats.rank(tiers[tier + 1])[:1]
+    return models
+
+
+_last_model: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "automanim_last_model", default=None
+)
+
+
+def last_model() -> str | None:
+    """The model whose answer the latest ``_llm_call`` in this context returned."""
+    return _last_model.get()
+
+
+# ── LLM Client ───────────────────────────────────────────────────────────────
+
+_llm_loop: asyncio.AbstractEventLoop | None = None
+_llm_loop_lock = threading.Lock()
+_llm_client: AsyncOpenAI | None = None
+_llm_semaphore: asyncio.Semaphore | None = None
+
+
+def get_llm_loop() -> asyncio.AbstractEventLoop:
+    """The background event loop every LLM request runs on (started lazily)."""
+    global _llm_loop
+    import asyncio
+
+    with _llm_loop_lock:
+        if _llm_loop is None:
+            _llm_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_llm_loop.run_forever, name="automanim-llm", daemon=True
+            ).start()
+            atexit.register(_close_llm_client)
+    return _llm_loop
+
+
+def run_llm(coro):
+    """Run ``coro`` on the LLM loop and block the calling thread for its result."""
+    import asyncio
+
+    return asyncio.run_coroutine_threadsafe(coro, get_llm_loop()).result()
+
+
+def _get_llm_client() -> AsyncOpenAI:
+    """Shared client; only called from the LLM loop, so no locking is needed."""
+    global _llm_client, _llm_semaphore
+    if _llm_client is None:
+        import asyncio
+
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        _llm_client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            max_retries=0,  # retried with jitter in _complete_async
+            timeout=LLM_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_CONCURRENCY,
+                    max_keepalive_connections=LLM_CONCURRENCY,
+                    keepalive_expiry=120,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            ),
+        )
+        _llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    return _llm_client
+
+
+def warm_llm_client():
+    """Start the LLM loop and create the shared client before the first request."""
+
+    async def create():
+        _get_llm_client()
+
+    run_llm(create())
+
+
+def _close_llm_client():
+    if _llm_client is not None and _llm_loop is not None and _llm_loop.is_running():
+        try:
+            run_llm(_llm_client.close())
+        except Exception:
+            pass
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying after ``error``, or None to give up.
+
+    Rate limits (429), server errors (5xx), timeouts and dropped connections
+    are retried with full-jitter exponential backoff; a Retry-After header
+    from the server is honoured when it asks for longer.
+    """
+    from openai import APIConnectionError, APIStatusError
+
+    if attempt >= LLM_MAX_RETRIES:
+        return None
+    if isinstance(error, APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+    elif not isinstance(error, (APIConnectionError, TimeoutError)):
+        return None
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return min(delay, LLM_BACKOFF_MAX)
+
+
+async def _complete_async(
+    messages: list[dict],
+    on_update=None,
+    temperature: float | None = None,
+    check: bool = True,
+    run: RunMetrics | None = None,
+    model: str = MODEL,
+) -> tuple[str, str | None]:
+    """Stream a chat completion from ``model``. Returns (content, abort_reason).
+
+    After every completed line the fence-stripped partial code is passed to
+    ``early_abort_reason``; if it reports a problem no later tokens can fix,
+    the stream is closed and the partial code is returned together with the
+    reason. A finished script without ``class GenScene`` is returned with a
+    reason too. ``on_update`` is called with the partial code as it grows.
+    ``check=False`` streams replies that aren't a script (patches) unchecked.
+
+    At most ``LLM_CONCURRENCY`` requests are in flight; each is bounded by
+    ``LLM_TIMEOUT`` and retried per ``_retry_delay``, restarting the stream.
+    Token usage is added to ``run``.
+    """
+    import asyncio
+
+    client = _get_llm_client()
+    params = {} if temperature is None else {"temperature": temperature}
+    attempt = 0
+    while True:
+        content, usage = "", None
+        try:
+            async with _llm_semaphore, asyncio.timeout(LLM_TIMEOUT):
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **params,
+                )
+                checked_lines = 0
+                try:
+                    async for chunk in stream:
+                        # The final chunk carries the token usage and no choices.
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content or ""
+                        if not delta:
+                            continue
+                        content += delta
+                        partial = clean_partial_code(content) if check else content
+                        if on_update is not None:
+                            on_update(partial)
+                        if not check:
+                            continue
+
+                        lines = partial.count("\n")
+                        if lines > checked_lines:
+                            checked_lines = lines
+                            reason = early_abort_reason(partial)
+                            if reason:
+                                return partial, reason
+                finally:
+                    await stream.close()
+                    if run is not None:
+                        # Streams cancelled early never receive their usage chunk.
+                        run.add_usage(usage)
+            if check and "class GenScene" not in content:
+                return content, "the script has no 'class GenScene'"
+            return content, None
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+# ── Core Logic ───────────────────────────────────────────────────────────────
+
+
+async def _complete_routed(
+    messages: list[dict],
+    models: list[str],
+    on_update=None,
+    temperature: float | None = None,
+    check: bool = True,
+    run: RunMetrics | None = None,
+) -> tuple[str, str | None, str]:
+    """Ask ``models[0]``, hedging with ``models[1]`` when ``HEDGE`` is on.
+
+    Returns (content, abort_reason, model). A hedged request starts the
+    runner-up once the first model has taken longer than its p95 latency or
+    has answered with something unusable; the first answer that isn't
+    cancelled early wins and the other stream is closed. Every request's
+    latency and outcome goes to ``model_stats``.
+    """
+    import asyncio
+
+    leader = {"model": None}
+
+    def forward(model: str):
+        def update(partial: str):
+            # Preview one stream at a time: the first to produce tokens.
+            if leader["model"] in (None, model):
+                leader["model"] = model
+                if on_update is not None:
+                    on_update(partial)
+
+        return update
+
+    async def attempt(model: str) -> tuple[str, str | None, str]:
+        start = time.perf_counter()
+        try:
+            content, reason = await _complete_async(
+                messages, forward(model), temperature, check, run, model
+            )
+        except Exception:
+            model_stats.record(model, time.perf_counter() - start, False)
+            raise
+        finally:
+            if leader["model"] == model:
+                leader["model"] = None
+        model_stats.record(model, time.perf_counter() - start, reason is None)
+        return content, reason, model
+
+    if not HEDGE or len(models) < 2:
+        return await attempt(models[0])
+
+    delay = model_stats.latency(models[0], 0.95) or HEDGE_DELAY
+    tasks = [asyncio.create_task(attempt(models[0]))]
+    pending = set(tasks)
+    fallback = error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=delay if len(tasks) == 1 else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                try:
+                    content, reason, model = task.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if reason is None:
+                    if model != models[0]:
+                        model_stats.record_hedge_win(model)
+                    return content, reason, model
+                fallback = fallback or (content, reason, model)
+            if len(tasks) == 1:
+                tasks.append(asyncio.create_task(attempt(models[1])))
+                pending.add(tasks[-1])
+    finally:
+        for task in pending:
+            task.cancel()
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+def _complete(
+    messages: list[dict],
+    on_update=None,
+    temperature: float | None = None,
+    check: bool = True,
+    models: list[str] | None = None,
+) -> tuple[str, str | None, str]:
+    """Stream a chat completion. Returns (content, abort_reason, model).
+
+    Blocking front end to ``_complete_routed``: the request runs on the shared
+    LLM event loop, so any number of threads can call this concurrently.
+    """
+    return run_llm(
+        _complete_routed(
+            messages,
+            models or route_models(),
+            on_update,
+            temperature,
+            check,
+            current_run(),
+        )
+    )
+
+
+def _stream_frame(label: str, frame: str, elapsed: float | None = None, partial=""):
+    """Spinner line plus a preview of the last streamed lines of code."""
+    status = "  generating Manim code…"
+    if elapsed is not None:
+        status += f" ({elapsed:.1f}s)"
+    header = Text.assemble(
+        Text(f" {frame} ", style="bold bright_magenta"),
+        Text(label, style="bold white"),
+        Text(status, style="dim white"),
+    )
+    if not partial.strip():
+        return header
+    from rich.syntax import Syntax
+
+    lines = partial.splitlines()
+    tail = lines[-STREAM_PREVIEW_LINES:]
+    preview = Syntax(
+        "\n".join(tail),
+        "python",
+        theme="monokai",
+        line_numbers=True,
+        start_line=len(lines) - len(tail) + 1,
+        word_wrap=False,
+    )
+    return Group(
+        header,
+        Panel(preview, border_style="bright_black", box=box.ROUNDED, padding=(0, 0)),
+    )
+
+
+def _llm_call(
+    messages: list[dict],
+    spinner_label: str = "Thinking",
+    variant: int = 0,
+    live: bool = True,
+    check: bool = True,
+    models: list[str] | None = None,
+) -> str:
+    """Internal helper: stream the LLM reply with a live code preview.
+
+    ``models`` comes from ``route_models`` (first tier by default); the model
+    that answered is available from ``last_model`` afterwards. Completions are
+    served from ``llm_cache`` when the same models and messages have been seen
+    before. A generation cancelled by the early checks returns
+    its partial code uncached, so the usual validation routes it to a fix.
+
+    ``variant`` > 0 requests an alternative sample (sampled hotter and cached
+    under its own key) for speculative candidates. ``live=False`` skips the
+    spinner so several calls can run from worker threads at once. ``check``
+    is passed on to ``_complete``.
+    """
+    temperature = SPECULATIVE_TEMPERATURE if variant else None
+    models = models or route_models()
+    route = ",".join(sorted(models))
+    cache_key = (
+        LLMCache.key(route, messages, variant=variant)
+        if variant
+        else LLMCache.key(route, messages)
+    )
+    cached = llm_cache.get(cache_key)
+    # Cached answers say nothing new about any model.
+    _last_model.set(None)
+    if cached is not None:
+        print_step("↺", spinner_label, "served from LLM cache", style="bright_blue")
+        if current_run() is not None:
+            current_run().add_usage(None, cached=True)
+        return cached
+
+    if console.quiet or not live:
+        # Batch workers share the console; a Live spinner per thread would clash.
+        code, abort_reason, model = _complete(
+            messages, temperature=temperature, check=check, models=models
+        )
+        _last_model.set(model)
+        if abort_reason is None:
+            llm_cache.put(cache_key, model, code)
+        return code
+
+    import asyncio
+
+    from rich.live import Live
+
+    with Live(
+        _stream_frame(spinner_label, "⠦"),
+        console=console,
+        refresh_per_second=10,
+        transient=True,
+    ) as live:
+        start = time.time()
+        result = {"code": None, "abort": None, "model": None, "partial": ""}
+
+        def on_update(partial: str):
+            result["partial"] = partial
+
+        async def spin():
+            frames = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+            for frame in itertools.cycle(frames):
+                live.update(
+                    _stream_frame(
+                        spinner_label, frame, time.time() - start, result["partial"]
+                    )
+                )
+                await asyncio.sleep(0.1)
+
+        async def complete_live():
+            # The spinner is a task on the LLM loop, not a polling thread.
+            spinner = asyncio.create_task(spin())
+            try:
+                (
+                    result["code"],
+                    result["abort"],
+                    result["model"],
+                ) = await _complete_routed(
+                    messages, models, on_update, temperature, check, current_run()
+                )
+            finally:
+                spinner.cancel()
+
+        run_llm(complete_live())
+    _last_model.set(result["model"])
+
+    elapsed = time.time() - start
+    if result["abort"]:
+        print_step(
+            "✗",
+            f"{spinner_label} cancelled early",
+            f"{result['abort']} ({elapsed:.1f}s)",
+            style="bright_red",
+        )
+        return result["code"]
+
+    llm_cache.put(cache_key, result["model"], result["code"])
+    return result["code"]
+
+
+def generate_code(prompt: str, variant: int = 0, live: bool = True) -> str:
+    """Call the LLM and return the generated Python code.
+
+    The most similar scenes in ``scene_library`` are sent along as few-shot
+    examples. If the library has a script for this very prompt (ignoring
+    case and punctuation), the first candidate reuses it without asking the
+    LLM.
+    """
+    print_blank()
+    with timed("generate", variant=variant) as sample:
+        served = None if variant else scene_library.lookup(prompt)
+        if served is not None:
+            code = served
+            sample["served"] = True
+            _last_model.set(None)
+        else:
+            examples = scene_library.examples(prompt, SCENE_EXAMPLES)
+            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+            for example in examples:
+                messages.append({"role": "user", "content": example["prompt"]})
+                messages.append({"role": "assistant", "content": example["code"]})
+            messages.append({"role": "user", "content": prompt})
+            code = _llm_call(
+                messages, spinner_label="Thinking", variant=variant, live=live
+            )
+            sample["model"] = last_model()
+            sample["examples"] = len(examples)
+    if served is not None:
+        print_step(
+            "↺",
+            "Thinking",
+            "reused the scene rendered for this prompt",
+            style="bright_blue",
+        )
+    elif examples:
+        print_step(
+            "✓",
+            "Code generated",
+            f"{len(examples)} similar scenes as examples",
+            style="bright_green",
+        )
+    else:
+        print_step("✓", "Code generated", style="bright_green")
+    return code
+
+
+def fix_code(
+    original_code: str,
+    error_output: str,
+    original_prompt: str,
+    variant: int = 0,
+    live: bool = True,
+    failed_heals: int = 0,
+) -> str:
+    """Send the broken code and distilled error back to the LLM for a fix.
+
+    With ``HEAL_MODE == "patch"`` a long, syntactically valid script is fixed
+    with SEARCH/REPLACE edits instead of a rewrite; if the edits don't apply,
+    the full rewrite is requested after all. ``failed_heals`` picks the model
+    tier (see ``route_models``).
+    """
+    print_blank()
+    error_digest = format_error_digest(distill_error(error_output, original_code))
+
+    fix_prompt = f"""The following Manim script was generated for this request:
+---
+{original_prompt}
+---
+
+Here is the code that failed:
+```python
+{original_code}
+```
+
+Here is the error from running it:
+```
+{error_digest}
+```
+"""
+
+    models = route_models(failed_heals)
+    with timed("heal", variant=variant) as sample:
+        patch_mode = (
+            HEAL_MODE == "patch"
+            and original_code.count("\n") + 1 >= PATCH_MIN_LINES
+            and validate_code_syntax(original_code)[0]
+        )
+        if patch_mode:
+            messages = [
+                {"role": "system", "content": PATCH_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": fix_prompt
+                    + "\nPlease fix the code so it runs without errors. "
+                    "Output ONLY SEARCH/REPLACE blocks.",
+                },
+            ]
+            reply = _llm_call(
+                messages,
+                spinner_label="Patching",
+                variant=variant,
+                live=live,
+                check=False,
+                models=models,
+            )
+            patched = apply_patch(original_code, parse_patch(reply))
+            if patched is not None:
+                sample["via"] = "patch"
+                sample["model"] = last_model()
+                print_step("✓", "Patch applied", style="bright_green")
+                return patched
+            print_step(
+                "↻",
+                "Patch did not apply",
+                "falling back to a full rewrite",
+                style="bright_yellow",
+            )
+
+        messages = [
+            {"role": "system", "content": FIX_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": fix_prompt
+                + "\nPlease fix the code so it runs without errors. "
+                "Output ONLY the corrected Python code.",
+            },
+        ]
+        code = _llm_call(
+            messages,
+            spinner_label="Healing",
+            variant=variant,
+            live=live,
+            models=models,
+        )
+        sample["via"] = "rewrite"
+        sample["model"] = last_model()
+        print_step("✓", "Fix generated", style="bright_green")
+        return code
+
+
+class _PoolCancel:
+    """A cancel flag that crosses process boundaries: set once ``path`` exists.
+
+    ``threading.Event`` doesn't pickle, so renders sent to a process pool get
+    one of these instead; the renderers only ever call ``is_set``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.clear()
+
+    def is_set(self) -> bool:
+        return self.path.exists()
+
+    def set(self):
+        self.path.touch()
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def _run_manim(
+    args: list[str],
+    cwd: str,
+    cancel: threading.Event | None = None,
+    limits: dict | None = None,
+    timeout: float | None = None,
+) -> tuple[int, str, str]:
+    """Run manim's CLI with ``args`` in ``cwd``; module-level so it pickles.
+
+    The process runs in its own process group under ``limits`` (see
+    ``_install_render_limits``). Past ``timeout`` seconds, or once ``cancel``
+    is set, the whole group is killed and a structured message is appended to
+    stderr. Through a process pool ``cancel`` is a ``_PoolCancel``.
+    """
+    limits = render_limits() if limits is None else limits
+    timeout = RENDER_TIMEOUT if timeout is None else timeout
+    proc = subprocess.Popen(
+        [sys.executable, "-c", _manim_bootstrap(), json.dumps(limits), *args],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=os.name == "posix",
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                kind, returncode = "cancel", None
+            elif deadline is not None and time.monotonic() > deadline:
+                kind, returncode = "timeout", RENDER_TIMEOUT_EXIT
+            else:
+                continue
+            _kill_process_tree(proc.pid)
+            proc.kill()
+            stdout, stderr = proc.communicate()
+            return (
+                proc.returncode if returncode is None else returncode,
+                stdout,
+                stderr + "\n" + render_limit_message(kind, timeout),
+            )
+
+    if _limit_breach(proc.returncode) == "cpu":
+        stderr += "\n" + render_limit_message("cpu", limits["cpu"])
+    return proc.returncode, stdout, stderr
+
+
+def run_render(
+    script_path: Path,
+    render_pool: Executor | None = None,
+    cancel: threading.Event | None = None,
+    dry_run: bool = False,
+) -> tuple[int, str, str, bool]:
+    """Render ``script_path`` without console output.
+
+    Returns (returncode, stdout, full_output, cached). Manim runs in the
+    script's directory, so its ``media/`` tree lands next to the script. When
+    ``render_pool`` is given the manim process is started from one of its
+    workers, which bounds how many renders run at once.
+
+    ``dry_run`` runs the scene with manim's ``-s`` path instead: every
+    ``play``/``wait`` jumps straight to its end state and only the last frame
+    is rasterised, so no video is encoded but errors raised in ``construct()``
+    still surface. A dry-run failure is recorded as a failure of the full
+    render, since the full render runs the same ``construct()``. The number of
+    animations it counts lets the full render be split (see ``render_movie``).
+
+    Byte-identical scripts are answered from ``render_cache``: a cached success
+    restores the stored MP4 to manim's output path, a cached failure returns
+    the stored error output.
+    """
+    with timed("render", dry_run=dry_run) as sample:
+        cache_key = RenderCache.key(script_path.read_text(encoding="utf-8"))
+        cached = render_cache.get(cache_key)
+        if cached:
+            returncode, output, cached_video = cached
+            sample.update(cached=True, returncode=returncode)
+            if cached_video is not None and not dry_run:
+                target = video_path(script_path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(cached_video, target)
+            return returncode, "", output, True
+
+        limits = render_limits()
+        if dry_run:
+            job = (
+                _run_manim,
+                [RENDER_QUALITY, "-s", script_path.name, "GenScene"],
+                str(script_path.parent.absolute()),
+            )
+        else:
+            job = (
+                render_movie,
+                script_path,
+                RENDER_QUALITY,
+                SEGMENTS,
+                _scene_plays.get(cache_key),
+            )
+        # The render worker runs one manim per scene; segmented renders start
+        # their own processes through ``render_movie`` instead.
+        if RENDER_BACKEND == "worker" and (dry_run or SEGMENTS <= 1):
+            checkout = (
+                contextlib.nullcontext()
+                if dry_run
+                else partial_movies.checkout(script_path, RENDER_QUALITY)
+            )
+            with checkout:
+                returncode, stdout, stderr = get_render_workers().render(
+                    script_path, RENDER_QUALITY, cancel, dry_run, limits, RENDER_TIMEOUT
+                )
+        elif render_pool is not None:
+            flag = None
+            if cancel is not None:
+                flag = _PoolCancel(script_path.with_name(f".{script_path.name}.cancel"))
+            future = render_pool.submit(*job, flag, limits, RENDER_TIMEOUT)
+            try:
+                # Relay ``cancel`` to the pool process, or drop a queued render.
+                while flag is not None and not future.done():
+                    if cancel.wait(0.2):
+                        flag.set()
+                        future.cancel()
+                        break
+                if future.cancelled():
+                    returncode, stdout = -signal.SIGKILL, ""
+                    stderr = render_limit_message("cancel", 0)
+                else:
+                    returncode, stdout, stderr = future.result()
+            finally:
+                if flag is not None:
+                    flag.clear()
+        else:
+            returncode, stdout, stderr = job[0](
+                *job[1:], cancel, limits, RENDER_TIMEOUT
+            )
+
+        stderr, probe = _split_probe(stderr)
+        sample.update(cached=False, returncode=returncode)
+        if probe is not None:
+            sample["child_cpu"] = probe.get("cpu", 0.0)
+            if probe.get("encode"):
+                record_stage("encode", probe["encode"])
+            if probe.get("segments"):
+                sample["segments"] = probe["segments"]
+            if not dry_run and probe.get("animations"):
+                partial_movies.record(probe)
+                sample.update(
+                    animations=probe["animations"], reused=probe.get("reused", 0)
+                )
+            if dry_run and returncode == 0 and "plays" in probe:
+                _scene_plays[cache_key] = probe["plays"]
+
+        # Combine stdout and stderr for error context
+        full_output = ""
+        if stderr:
+            full_output += stderr
+        if returncode != 0 and stdout:
+            full_output += "\n" + stdout
+        full_output = full_output.strip()
+
+        # Only remember failures raised from the script itself; environment
+        # problems (missing manim, broken ffmpeg) and cancelled renders must not
+        # poison the cache.
+        if cancel is not None and cancel.is_set():
+            pass
+        elif returncode == 0:
+            if dry_run:
+                return returncode, stdout, full_output, False
+            video = video_path(script_path)
+            render_cache.put(
+                cache_key, 0, full_output, video if video.exists() else None
+            )
+        elif script_path.name in full_output:
+            render_cache.put(cache_key, returncode, full_output)
+
+        return returncode, stdout, full_output, False
+
+
+def render_scene(
+    script_path: Path, render_pool: Executor | None = None
+) -> tuple[int, str]:
+    """Run manim to render the scene. Returns (returncode, stderr_output)."""
+    report("render_start", quality=RENDER_QUALITY)
+
+    before = partial_movies.reused, partial_movies.rendered
+    returncode, stdout, full_output, cached = run_render(script_path, render_pool)
+    reused = partial_movies.reused - before[0]
+    rendered = partial_movies.rendered - before[1]
+
+    report("render_output", stdout=stdout)
+
+    suffix = " (cached)" if cached else ""
+    if reused:
+        suffix = f" ({reused} of {reused + rendered} animations reused)"
+    if returncode == 0:
+        print_success(f"Render complete!{suffix}")
+    else:
+        print_error(f"Manim exited with code {returncode}{suffix}")
+
+    return returncode, full_output
+
+
+def dry_run_scene(
+    script_path: Path, render_pool: Executor | None = None
+) -> tuple[int, str]:
+    """Execute ``construct()`` without encoding video. Returns (returncode, output)."""
+    start = time.time()
+    returncode, _, output, cached = run_render(script_path, render_pool, dry_run=True)
+    detail = "cached" if cached else f"{time.time() - start:.1f}s"
+    if returncode == 0:
+        print_step("✓", "Dry run passed", detail, style="bright_green")
+    else:
+        print_step("✗", "Dry run failed", detail, style="bright_red")
+    return returncode, output
+
+
+def checked_render(
+    script_path: Path,
+    render_pool: Executor | None = None,
+    cancel: threading.Event | None = None,
+) -> tuple[int, str, str, bool]:
+    """``run_render`` preceded by a dry run when ``DRY_RUN_VALIDATION`` is on."""
+    if DRY_RUN_VALIDATION:
+        result = run_render(script_path, render_pool, cancel, dry_run=True)
+        if result[0] != 0:
+            return result
+    return run_render(script_path, render_pool, cancel)
+
+
+def clean_code(code: str) -> str:
+    """Strip markdown fences and whitespace from LLM output."""
+    with timed("clean"):
+        code = code.strip()
+        # Handle ```python ... ``` blocks
+        if code.startswith("```python"):
+            code = code[len("```python"):]
+        elif code.startswith("```"):
+            code = code[len("```"):]
+        if code.endswith("```"):
+            code = code[:-3]
+        return code.strip()
+
+
+def clean_partial_code(text: str) -> str:
+    """Incremental ``clean_code`` for a completion that is still streaming.
+
+    Drops an opening fence line once it is complete, cuts at a closing fence,
+    and holds back anything that may still turn out to be a fence.
+    """
+    text = text.lstrip()
+    if text.startswith("```"):
+        newline = text.find("\n")
+        if newline == -1:
+            return ""
+        text = text[newline + 1 :]
+    elif "```".startswith(text):
+        return ""
+
+    closing = re.search(r"^```", text, re.MULTILINE)
+    if closing:
+        return text[: closing.start()]
+    return text.rstrip("`")
+
+
+# SyntaxErrors that more tokens can still resolve (open brackets, strings, blocks).
+_RECOVERABLE_SYNTAX = (
+    "was never closed",
+    "unterminated triple-quoted",
+    "unexpected EOF",
+    "expected an indented block",
+)
+
+
+def early_abort_reason(partial: str) -> str | None:
+    """Return why a partially streamed script can't succeed, or None.
+
+    Only the completed lines are checked. A syntax error is unrecoverable when
+    it sits before the last completed line and isn't one of the errors caused
+    merely by the code being cut off.
+    """
+    complete = partial[: partial.rfind("\n") + 1]
+    if not complete.strip():
+        return None
+
+    n_lines = complete.count("\n")
+    if "class GenScene" not in complete and n_lines > STREAM_HEADER_LINES:
+        return f"no 'class GenScene' in the first {STREAM_HEADER_LINES} lines"
+
+    try:
+        ast.parse(complete)
+    except SyntaxError as e:
+        if (
+            e.lineno is not None
+            and e.lineno < n_lines
+            and not any(marker in e.msg for marker in _RECOVERABLE_SYNTAX)
+        ):
+            return f"SyntaxError at line {e.lineno}: {e.msg}"
+    return None
+
+
+def validate_code_syntax(code: str) -> tuple[bool, str]:
+    """Check if the code has valid Python syntax before even trying to render."""
+    try:
+        compile(code, "<generated_scene>", "exec")
+        return True, ""
+    except SyntaxError as e:
+        return False, f"SyntaxError at line {e.lineno}: {e.msg}"
+
+
+def validate_scene_class(code: str) -> tuple[bool, str]:
+    """Check that the code defines a 'GenScene' class."""
+    if "class GenScene" not in code:
+        return False, "Generated code does not contain a 'class GenScene' definition."
+    return True, ""
+
+
+# ── Static API Check ─────────────────────────────────────────────────────────
+
+# Names and methods from ManimGL / old Manim CE that LLMs still reach for.
+DEPRECATED_NAMES = {
+    "ShowCreation": "Create",
+    "ShowCreationThenDestruction": "ShowPassingFlash",
+    "TextMobject": "Tex",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFrom": "FadeIn(mobject, shift=...)",
+    "FadeInFromDown": "FadeIn(mobject, shift=UP)",
+    "FadeInFromLarge": "FadeIn(mobject, scale=...)",
+    "FadeOutAndShift": "FadeOut(mobject, shift=...)",
+    "FadeOutAndShiftDown": "FadeOut(mobject, shift=DOWN)",
+    "GraphScene": "Axes inside a regular Scene",
+    "NumberLineScene": "NumberLine inside a regular Scene",
+}
+DEPRECATED_ATTRS = {
+    "get_graph": "plot",
+    "get_derivative_graph": "plot_derivative_graph",
+}
+
+_MATH_IN_TEXT = re.compile(
+    r"\\(frac|sqrt|sum|int|prod|lim|infty|partial|alpha|beta|gamma|delta|theta"
+    r"|lambda|pi|sigma|omega|cdot|times|leq|geq|neq|approx|vec)\b|(?<!\\)[_^]"
+)
+# Anything that switches a Tex string into math mode.
+_MATH_MODE = re.compile(
+    r"(?<!\\)\$|\\[(\[]|\\ensuremath\b"
+    r"|\\begin\{(equation|align|alignat|flalign|gather|multline|eqnarray"
+    r"|math|displaymath)\*?\}"
+)
+# Characters a non-raw string produces from "\a", "\b", "\f", "\v", "\t", "\r".
+_ESCAPE_ACCIDENTS = {
+    "\a": "\\a",
+    "\b": "\\b",
+    "\f": "\\f",
+    "\v": "\\v",
+    "\t": "\\t",
+    "\r": "\\r",
+}
+
+
+def _accepted_kwargs(cls) -> list[str] | None:
+    """Keyword arguments ``cls(...)`` accepts, or None if any ``**kwargs`` is open."""
+    import inspect
+
+    names = set()
+    for klass in cls.__mro__:
+        init = klass.__dict__.get("__init__")
+        if init is None:
+            continue
+        try:
+            signature = inspect.signature(init)
+        except (TypeError, ValueError):
+            return None
+        open_ended = False
+        for param in signature.parameters.values():
+            if param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY):
+                names.add(param.name)
+            elif param.kind == param.VAR_KEYWORD:
+                open_ended = True
+        if not open_ended:
+            names.discard("self")
+            return sorted(names)
+    return None
+
+
+def _instance_attrs(cls, seen: dict) -> set[str]:
+    """Attributes manim classes assign on ``self`` (invisible to ``dir(cls)``)."""
+    import inspect
+
+    attrs = set()
+    for klass in cls.__mro__:
+        if not klass.__module__.startswith("manim"):
+            continue
+        if klass not in seen:
+            found = set()
+            try:
+                tree = ast.parse(textwrap.dedent(inspect.getsource(klass)))
+            except (OSError, TypeError, SyntaxError):
+                tree = None
+            for node in ast.walk(tree) if tree else ():
+                if (
+                    isinstance(node, ast.Attribute)
+                    and isinstance(node.ctx, ast.Store)
+                    and isinstance(node.value, ast.Name)
+                    and node.value.id == "self"
+                ):
+                    found.add(node.attr)
+            seen[klass] = found
+        attrs |= seen[klass]
+    return attrs
+
+
+def _build_manim_api_index() -> dict:
+    """Describe the installed manim's public API (runs in a throwaway process)."""
+    import inspect
+    import manim
+
+    names = getattr(manim, "__all__", None) or [
+        name for name in dir(manim) if not name.startswith("_")
+    ]
+    index = {"manim": manim_version(), "names": sorted(names), "classes": {}}
+    seen = {}
+    for name in names:
+        obj = getattr(manim, name, None)
+        if not inspect.isclass(obj):
+            continue
+        attrs = {attr for attr in dir(obj) if not attr.startswith("__")}
+        index["classes"][name] = {
+            "attrs": sorted(attrs | _instance_attrs(obj, seen)),
+            "kwargs": _accepted_kwargs(obj),
+            "dynamic": any(
+                "__getattr__" in klass.__dict__
+                for klass in obj.__mro__
+                if klass is not object
+            ),
+        }
+    return index
+
+
+@lru_cache(maxsize=1)
+def load_manim_api_index() -> dict | None:
+    """Load the API index for the installed manim, building it on first use.
+
+    The index is built once per manim version in a spawned process (so this
+    process never imports manim) and cached as JSON under ``CACHE_DIR``.
+    Returns None when manim isn't installed or the index can't be built.
+    """
+    version = manim_version()
+    if version == "unknown":
+        return None
+    path = CACHE_DIR / f"manim_api_{version}.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        pass
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            index = pool.submit(_build_manim_api_index).result()
+    except Exception:
+        return None
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp.write_text(json.dumps(index), encoding="utf-8")
+    os.replace(tmp, path)
+    return index
+
+
+def _suggest(name: str, candidates) -> str:
+    import difflib
+
+    match = difflib.get_close_matches(name, candidates, n=1)
+    return f" (did you mean '{match[0]}'?)" if match else ""
+
+
+def lint_manim_api(code: str, index: dict) -> list[dict]:
+    """Statically check ``code`` against the manim API ``index``.
+
+    Returns a list of issues, each ``{"line", "rule", "severity", "message"}``
+    with severity "error" (will fail at runtime) or "warning" (likely wrong).
+    """
+    import builtins
+
+    tree = ast.parse(code)
+    manim_names = set(index["names"])
+    classes = index["classes"]
+    issues = []
+
+    def report(node, rule: str, message: str, severity: str = "error"):
+        issues.append(
+            {
+                "line": getattr(node, "lineno", 0),
+                "rule": rule,
+                "severity": severity,
+                "message": message,
+            }
+        )
+
+    # ── Collect bindings ──────────────────────────────────────────────
+    bound = set(dir(builtins))
+    stored_attrs = set()
+    star_modules = set()
+    var_types: dict[str, set] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+            var_types.setdefault(node.arg, set()).add(None)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                bound.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == "*":
+                    star_modules.add(node.module or "")
+                else:
+                    bound.add(alias.asname or alias.name)
+                    if (node.module or "").split(".")[0] == "manim" and (
+                        alias.name not in manim_names
+                    ):
+                        report(
+                            node,
+                            "unknown-import",
+                            f"'{alias.name}' cannot be imported from manim"
+                            + _suggest(alias.name, manim_names),
+                        )
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)):
+            if node.name:
+                bound.add(node.name)
+        elif isinstance(node, ast.Attribute) and not isinstance(node.ctx, ast.Load):
+            stored_attrs.add(node.attr)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            value = node.value
+            inferred = None
+            if (
+                isinstance(value, ast.Call)
+                and isinstance(value.func, ast.Name)
+                and value.func.id in classes
+                and not isinstance(node, ast.AugAssign)
+            ):
+                inferred = value.func.id
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        single = isinstance(target, ast.Name)
+                        var_types.setdefault(name.id, set()).add(
+                            inferred if single else None
+                        )
+        elif isinstance(node, (ast.For, ast.comprehension, ast.withitem)):
+            target = (
+                node.optional_vars if isinstance(node, ast.withitem) else node.target
+            )
+            for name in ast.walk(target) if target is not None else ():
+                if isinstance(name, ast.Name):
+                    var_types.setdefault(name.id, set()).add(None)
+
+    manim_star = any(module.split(".")[0] == "manim" for module in star_modules)
+    foreign_star = any(module.split(".")[0] != "manim" for module in star_modules)
+    if manim_star:
+        bound |= manim_names
+
+    # Locally (re)defined names shadow the manim ones and aren't checked.
+    local_defs = {
+        node.name
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+
+    def class_of(name: str) -> str | None:
+        if name in local_defs or name not in classes:
+            return None
+        return name
+
+    def check_attr(node: ast.Attribute, cls_name: str, what: str):
+        attr = node.attr
+        info = classes[cls_name]
+        if attr.startswith("__") or attr in stored_attrs or attr in info["attrs"]:
+            return
+        if attr in DEPRECATED_ATTRS:
+            report(
+                node,
+                "deprecated",
+                f"{what}.{attr} was removed; use .{DEPRECATED_ATTRS[attr]}",
+            )
+            return
+        if info["dynamic"] and attr.startswith(("get_", "set_")):
+            return
+        report(
+            node,
+            "unknown-attribute",
+            f"{what} ({cls_name}) has no attribute '{attr}'"
+            + _suggest(attr, info["attrs"]),
+        )
+
+    # ── GenScene's own attributes ─────────────────────────────────────
+    scene_base = None
+    scene_methods = set()
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "GenScene":
+            for base in node.bases:
+                if isinstance(base, ast.Name) and class_of(base.id):
+                    scene_base = base.id
+            scene_methods = {
+                item.name
+                for item in node.body
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+            } | {
+                target.id
+                for item in node.body
+                if isinstance(item, ast.Assign)
+                for target in item.targets
+                if isinstance(target, ast.Name)
+            }
+            if "CONFIG" in scene_methods:
+                report(
+                    node,
+                    "deprecated",
+                    "CONFIG class dicts are a ManimGL idiom and are ignored by "
+                    "Manim CE; pass settings to __init__ or set them in construct()",
+                )
+
+    # ── Check uses ────────────────────────────────────────────────────
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            name = node.id
+            if name in DEPRECATED_NAMES and name not in local_defs:
+                report(
+                    node,
+                    "deprecated",
+                    f"'{name}' is not part of Manim CE; use {DEPRECATED_NAMES[name]}",
+                    "warning" if name in manim_names else "error",
+                )
+            elif name not in bound and not foreign_star:
+                report(
+                    node,
+                    "unknown-name",
+                    f"'{name}' is not defined"
+                    + ("" if manim_star else " (missing 'from manim import *'?)")
+                    + _suggest(name, bound),
+                )
+
+        elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load):
+            value = node.value
+            if isinstance(value, ast.Name):
+                if value.id == "self" and scene_base:
+                    if node.attr not in scene_methods:
+                        check_attr(node, scene_base, "self")
+                elif class_of(value.id) and value.id in bound:
+                    check_attr(node, value.id, value.id)
+                else:
+                    types = var_types.get(value.id, set())
+                    if len(types) == 1 and None not in types:
+                        (cls_name,) = types
+                        if class_of(cls_name):
+                            check_attr(node, cls_name, value.id)
+            elif (
+                isinstance(value, ast.Call)
+                and isinstance(value.func, ast.Name)
+                and class_of(value.func.id)
+            ):
+                check_attr(node, value.func.id, f"{value.func.id}(...)")
+
+        elif isinstance(node, ast.Call):
+            func = node.func
+            cls_name = class_of(func.id) if isinstance(func, ast.Name) else None
+
+            # Keyword arguments the constructor chain doesn't accept
+            accepted = classes[cls_name]["kwargs"] if cls_name else None
+            if accepted is not None:
+                for keyword in node.keywords:
+                    if keyword.arg and keyword.arg not in accepted:
+                        report(
+                            keyword.value,
+                            "unknown-kwarg",
+                            f"{cls_name}() got an unexpected keyword argument "
+                            f"'{keyword.arg}'" + _suggest(keyword.arg, accepted),
+                        )
+
+            # self.play(mob.method, args) — ManimGL-style method animation
+            if (
+                isinstance(func, ast.Attribute)
+                and func.attr == "play"
+                and "Mobject" in classes
+            ):
+                for arg in node.args:
+                    if (
+                        isinstance(arg, ast.Attribute)
+                        and arg.attr in classes["Mobject"]["attrs"]
+                        and arg.attr != "animate"
+                    ):
+                        report(
+                            arg,
+                            "deprecated",
+                            f"passing the method '.{arg.attr}' to play() is not "
+                            f"supported in Manim CE; use mobject.animate.{arg.attr}(...)",
+                        )
+
+            # LaTeX strings
+            if cls_name in ("Tex", "MathTex", "Text", "MarkupText"):
+                for arg in node.args:
+                    if not (
+                        isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+                    ):
+                        continue
+                    text = arg.value
+                    accidents = [v for k, v in _ESCAPE_ACCIDENTS.items() if k in text]
+                    if cls_name in ("Tex", "MathTex") and accidents:
+                        report(
+                            arg,
+                            "latex-escape",
+                            f"{cls_name} string contains {', '.join(accidents)} "
+                            "escape characters — a LaTeX command lost its backslash; "
+                            'use a raw string r"..."',
+                        )
+                    elif cls_name in ("Tex", "MathTex") and re.search(r"\n[a-z]", text):
+                        report(
+                            arg,
+                            "latex-escape",
+                            f"{cls_name} string contains a newline followed by "
+                            "letters — '\\n' may have been meant as a LaTeX command; "
+                            'use a raw string r"..."',
+                            "warning",
+                        )
+                    if cls_name == "MathTex" and re.search(r"(?<!\\)\$", text):
+                        report(
+                            arg,
+                            "tex-misuse",
+                            "MathTex is already in math mode; remove the $ delimiters",
+                        )
+                    elif (
+                        cls_name == "Tex"
+                        and not _MATH_MODE.search(text)
+                        and _MATH_IN_TEXT.search(text)
+                    ):
+                        report(
+                            arg,
+                            "tex-misuse",
+                            "Tex string uses math commands outside math mode; use "
+                            "MathTex or wrap the math in $...$",
+                        )
+                    elif cls_name in ("Text", "MarkupText") and _MATH_IN_TEXT.search(
+                        text.replace("_", "")
+                    ):
+                        report(
+                            arg,
+                            "tex-misuse",
+                            f"{cls_name} does not render LaTeX; use MathTex for math",
+                            "warning",
+                        )
+
+    # One report per distinct problem keeps the fix prompt short.
+    unique = {}
+    for issue in sorted(issues, key=lambda issue: issue["line"]):
+        unique.setdefault((issue["rule"], issue["message"]), issue)
+    return list(unique.values())
+
+
+def format_lint_report(issues: list[dict]) -> str:
+    """Render lint issues as the structured feedback block sent to ``fix_code``."""
+    errors = sum(issue["severity"] == "error" for issue in issues)
+    lines = [
+        f"Static Manim API check (Manim CE {manim_version()}) found "
+        f"{errors} error(s) and {len(issues) - errors} warning(s):"
+    ]
+    for issue in issues:
+        lines.append(
+            f"- line {issue['line']} [{issue['rule']}, {issue['severity']}] "
+            f"{issue['message']}"
+        )
+    return "\n".join(lines)
+
+
+def validate_manim_api(code: str) -> tuple[bool, str]:
+    """Check names, attributes, kwargs and LaTeX usage against the manim API.
+
+    Passes when the API index is unavailable. Fails only on errors, but the
+    report lists warnings too so a fix can address both.
+    """
+    index = load_manim_api_index()
+    if index is None:
+        return True, ""
+    issues = lint_manim_api(code, index)
+    if not any(issue["severity"] == "error" for issue in issues):
+        return True, ""
+    return False, format_lint_report(issues)
+
+
+# ── Fix Memory ───────────────────────────────────────────────────────────────
+
+_LINT_ERROR = re.compile(r"^- line \d+ \[([\w-]+), error\] (.*)$")
+
+
+def _normalise_signature(text: str) -> str:
+    """Strip the script-specific parts (paths, numbers, addresses) of an error."""
+    text = re.sub(r"(?:[\w.~-]*/)+[\w.-]+", "<path>", text)
+    text = re.sub(r"0x[0-9a-fA-F]+", "0x…", text)
+    text = re.sub(r"\b\d+(?:\.\d+)?\b", "N", text)
+    return re.sub(r"\s+", " ", text).strip()[:200]
+
+
+def error_signatures(error_output: str) -> list[str]:
+    """Normalised signatures of the distinct failures in ``error_output``.
+
+    A static API report yields one signature per error it lists; a traceback
+    yields its exception; anything else its first meaningful line.
+    """
+    lint = [_LINT_ERROR.match(line.strip()) for line in error_output.splitlines()]
+    if any(lint):
+        return list(
+            dict.fromkeys(_normalise_signature(f"{m[1]}: {m[2]}") for m in lint if m)
+        )
+    digest = distill_error(error_output)
+    if digest["exception"]:
+        return [_normalise_signature(f"{digest['exception']}: {digest['message']}")]
+    return [_normalise_signature(digest["tail"][0])] if digest["tail"] else []
+
+
+def _builtin_rules(signature: str) -> list[dict]:
+    """Deterministic repairs for well-known failure signatures."""
+    rules = []
+    name = re.search(r"'(\w+)' is not (?:part of Manim CE|defined)", signature)
+    if name and DEPRECATED_NAMES.get(name[1], "").isidentifier():
+        new = DEPRECATED_NAMES[name[1]]
+        rules.append({"kind": "rename", "old": name[1], "new": new})
+    attr = re.search(r"\.(\w+) was removed|has no attribute '(\w+)'", signature)
+    if attr and (attr[1] or attr[2]) in DEPRECATED_ATTRS:
+        old = attr[1] or attr[2]
+        rules.append({"kind": "rename", "old": old, "new": DEPRECATED_ATTRS[old]})
+    kwarg = re.search(
+        r"(?:(?<![.\w])(\w+)\(\) )?got an unexpected keyword argument '(\w+)'",
+        signature,
+    )
+    if kwarg:
+        rules.append({"kind": "drop_kwarg", "kwarg": kwarg[2], "callee": kwarg[1]})
+    if "latex" in signature.lower():
+        rules.append({"kind": "raw_tex"})
+    return rules
+
+
+def _rule_key(rule: dict) -> str:
+    return json.dumps(
+        {k: v for k, v in rule.items() if k not in ("successes", "failures")},
+        sort_keys=True,
+    )
+
+
+def _describe_rule(rule: dict) -> str:
+    if rule["kind"] == "rename":
+        return f"rename {rule['old']} → {rule['new']}"
+    if rule["kind"] == "drop_kwarg":
+        return f"drop keyword argument '{rule['kwarg']}'"
+    if rule["kind"] == "raw_tex":
+        return "raw strings for LaTeX"
+    return f"recorded fix ({len(rule['edits'])} edit(s))"
+
+
+def _callee_name(call: ast.Call) -> str | None:
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return None
+
+
+def _offsets(code: str):
+    """Map an AST (lineno, col_offset) — col in UTF-8 bytes — to a str index."""
+    lines = code.splitlines(keepends=True)
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+
+    def offset(lineno: int, col: int) -> int:
+        prefix = lines[lineno - 1].encode("utf-8")[:col].decode("utf-8", "ignore")
+        return starts[lineno - 1] + len(prefix)
+
+    return offset
+
+
+def _apply_rule(code: str, rule: dict, lines: set[int]) -> str | None:
+    """Apply one stored repair; ``lines`` are the failing script lines, if known."""
+    if rule["kind"] == "diff":
+        return apply_patch(code, [tuple(edit) for edit in rule["edits"]])
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    offset = _offsets(code)
+    cuts: list[tuple[int, int, str]] = []  # (start, end, replacement)
+
+    for node in ast.walk(tree):
+        if rule["kind"] == "rename":
+            old = rule["old"]
+            if isinstance(node, (ast.Name, ast.alias)) and old in (
+                getattr(node, "id", None),
+                getattr(node, "name", None),
+            ):
+                start = offset(node.lineno, node.col_offset)
+                cuts.append((start, start + len(old), rule["new"]))
+            elif isinstance(node, ast.Attribute) and node.attr == old:
+                end = offset(node.end_lineno, node.end_col_offset)
+                cuts.append((end - len(old), end, rule["new"]))
+        elif not isinstance(node, ast.Call):
+            continue
+        elif rule["kind"] == "drop_kwarg":
+            if rule.get("callee") and _callee_name(node) != rule["callee"]:
+                continue
+            if (
+                not rule.get("callee")
+                and lines
+                and not lines & set(range(node.lineno, node.end_lineno + 1))
+            ):
+                continue
+            for keyword in node.keywords:
+                if keyword.arg == rule["kwarg"]:
+                    cuts.append(
+                        (
+                            offset(keyword.lineno, keyword.col_offset),
+                            offset(keyword.end_lineno, keyword.end_col_offset),
+                            "",
+                        )
+                    )
+        elif rule["kind"] == "raw_tex" and (_callee_name(node) or "").endswith("Tex"):
+            for arg in node.args:
+                if (
+                    isinstance(arg, ast.Constant)
+                    and isinstance(arg.value, str)
+                    and any(char in arg.value for char in _ESCAPE_ACCIDENTS)
+                ):
+                    start = offset(arg.lineno, arg.col_offset)
+                    if code[start] in "'\"":
+                        cuts.append((start, start, "r"))
+
+    # Apply back to front; drop cuts nested inside an earlier (outer) one.
+    patched, floor = code, len(code) + 1
+    for start, end, text in sorted(cuts, reverse=True):
+        if end > floor:
+            continue
+        if rule["kind"] == "rename" and code[start:end] != rule["old"]:
+            continue
+        if rule["kind"] == "drop_kwarg":
+            after = re.match(r"\s*,\s*", patched[end:])
+            before = re.search(r",\s*$", patched[:start])
+            if after:
+                end += after.end()
+            elif before:
+                start = before.start()
+        patched = patched[:start] + text + patched[end:]
+        floor = start
+    return patched if patched != code else None
+
+
+def _learn_rule(old_code: str, new_code: str) -> dict | None:
+    """Turn a successful fix into a reusable rule: a rename or a small diff."""
+    import difflib
+
+    old_lines, new_lines = old_code.splitlines(), new_code.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    opcodes = [op for op in matcher.get_opcodes() if op[0] != "equal"]
+    if not opcodes or len(opcodes) > 4:
+        return None
+
+    # A single identifier swapped everywhere generalises beyond this script.
+    swaps = set()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            swaps = None
+            break
+        for before, after in zip(old_lines[i1:i2], new_lines[j1:j2]):
+            tokens_before = re.split(r"(\W+)", before)
+            tokens_after = re.split(r"(\W+)", after)
+            if len(tokens_before) != len(tokens_after):
+                swaps = None
+                break
+            swaps |= {(a, b) for a, b in zip(tokens_before, tokens_after) if a != b}
+        if swaps is None:
+            break
+    if swaps is not None and len(swaps) == 1:
+        old, new = next(iter(swaps))
+        if old.isidentifier() and new.isidentifier():
+            return {"kind": "rename", "old": old, "new": new}
+
+    edits = []
+    for _, i1, i2, j1, j2 in opcodes:
+        lo, hi = max(0, i1 - 1), min(len(old_lines), i2 + 1)  # one line of context
+        search = old_lines[lo:hi]
+        if not "".join(search).strip() or len(search) > 20:
+            return None
+        replace = old_lines[lo:i1] + new_lines[j1:j2] + old_lines[i2:hi]
+        edits.append(["\n".join(search) + "\n", "\n".join(replace) + "\n"])
+    return {"kind": "diff", "edits": edits}
+
+
+class FixMemory:
+    """Local knowledge base of repairs keyed on normalised error signatures.
+
+    Each signature holds rules — AST rewrites (renames, dropped keyword
+    arguments, raw LaTeX strings) or diffs recorded from successful LLM
+    fixes — with success/failure counts. Built-in rules for well-known
+    signatures are derived on the fly. A rule counts as a success when the
+    next attempt no longer shows its signature; rules that keep failing are
+    evicted and blocked for that signature. The store is one JSON file, capped
+    at ``max_signatures`` least recently used signatures.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_signatures: int = FIX_MEMORY_MAX_SIGNATURES,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.max_signatures = max_signatures
+        self.enabled = enabled
+        self.hits = 0
+        self.learned = 0
+        self.evictions = 0
+        self._entries: dict | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        entries = self._load()
+        for signature in sorted(entries, key=lambda s: entries[s]["last_used"])[
+            : max(0, len(entries) - self.max_signatures)
+        ]:
+            del entries[signature]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(
+            f".{self.path.name}.{os.getpid()}.{threading.get_ident()}"
+        )
+        tmp.write_text(json.dumps(entries, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _entry(self, signature: str) -> dict:
+        entry = self._load().setdefault(
+            signature, {"rules": [], "blocked": [], "last_used": 0.0}
+        )
+        entry["last_used"] = time.time()
+        return entry
+
+    def repair(self, code: str, error_output: str) -> tuple[str, list[dict]] | None:
+        """Apply the best known repair for each failure in ``error_output``.
+
+        Returns (repaired code, applied rules) — hand the rules back through
+        ``settle`` once the repaired code has been tried — or None.
+        """
+        if not self.enabled:
+            return None
+        digest = distill_error(error_output, code)
+        lines = {frame["line"] for frame in digest["frames"][-1:]}
+        applied = []
+        with self._lock:
+            known = self._load()
+            for signature in error_signatures(error_output):
+                entry = known.get(signature, {"rules": [], "blocked": []})
+                stored = {_rule_key(rule) for rule in entry["rules"]}
+                rules = entry["rules"] + [
+                    rule
+                    for rule in _builtin_rules(signature)
+                    if _rule_key(rule) not in stored
+                    and _rule_key(rule) not in entry["blocked"]
+                ]
+                rules.sort(
+                    key=lambda r: (r.get("successes", 0) + 1)
+                    / (r.get("successes", 0) + r.get("failures", 0) + 2),
+                    reverse=True,
+                )
+                for rule in rules:
+                    repaired = _apply_rule(code, rule, lines)
+                    if repaired is not None and validate_code_syntax(repaired)[0]:
+                        code = repaired
+                        applied.append({"signature": signature, "rule": rule})
+                        break
+            self.hits += bool(applied)
+        return (code, applied) if applied else None
+
+    def _record(self, signature: str, rule: dict, fixed: bool):
+        entry = self._entry(signature)
+        key = _rule_key(rule)
+        if key in entry["blocked"]:
+            return
+        stored = next((r for r in entry["rules"] if _rule_key(r) == key), None)
+        if stored is None:
+            stored = {**rule, "successes": 0, "failures": 0}
+            entry["rules"].append(stored)
+        stored["successes" if fixed else "failures"] += 1
+        trials = stored["successes"] + stored["failures"]
+        if (
+            trials >= FIX_MEMORY_MIN_TRIALS
+            and stored["successes"] / trials < FIX_MEMORY_MIN_SUCCESS
+        ):
+            entry["rules"].remove(stored)
+            entry["blocked"].append(key)
+            self.evictions += 1
+
+    def settle(self, pending: dict | None, code: str, error_output: str | None):
+        """Record how the previous heal turned out.
+
+        ``pending`` describes the heal that produced ``code``: ``code`` and
+        ``error`` before it, plus the ``applied`` rules for a repair from
+        this memory (None for an LLM fix). ``error_output`` is what ``code``
+        failed with, or None if it rendered. Repairs update their stats; an
+        LLM fix that cleared a single failure is learned as a new rule.
+        """
+        if not self.enabled or pending is None:
+            return
+        remaining = set(error_signatures(error_output)) if error_output else set()
+        with self._lock:
+            if pending["applied"]:
+                for item in pending["applied"]:
+                    self._record(
+                        item["signature"],
+                        item["rule"],
+                        item["signature"] not in remaining,
+                    )
+            else:
+                signatures = error_signatures(pending["error"])
+                if len(signatures) != 1 or signatures[0] in remaining:
+                    return
+                rule = _learn_rule(pending["code"], code)
+                if rule is None:
+                    return
+                entry = self._entry(signatures[0])
+                key = _rule_key(rule)
+                if key in entry["blocked"] or any(
+                    _rule_key(r) == key for r in entry["rules"]
+                ):
+                    return
+                entry["rules"].append({**rule, "successes": 1, "failures": 0})
+                self.learned += 1
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._load()
+            return {
+                "hits": self.hits,
+                "learned": self.learned,
+                "evictions": self.evictions,
+                "signatures": len(entries),
+                "rules": sum(len(e["rules"]) for e in entries.values()),
+            }
+
+
+fix_memory = FixMemory(
+    CACHE_DIR / "fix_memory.json",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+# ── Scene Library ────────────────────────────────────────────────────────────
+
+_PROMPT_WORD = re.compile(r"[a-z0-9]+")
+
+
+def prompt_features(prompt: str) -> list[str]:
+    """Words, word pairs and per-word character trigrams of ``prompt``.
+
+    Case and punctuation are ignored; the trigrams let "circles" match
+    "circle".
+    """
+    words = _PROMPT_WORD.findall(prompt.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [padded[i : i + 3] for i in range(len(padded) - 2)]
+    return features
+
+
+def prompt_key(prompt: str) -> str:
+    """``prompt`` lowercased with punctuation and extra whitespace dropped."""
+    return " ".join(_PROMPT_WORD.findall(prompt.lower()))
+
+
+def prompt_vector(prompt: str, dim: int = SCENE_VECTOR_DIM):
+    """Hashed term counts of ``prompt``'s features as a float32 vector.
+
+    Features are hashed with CRC-32 (stable across processes, unlike
+    ``hash``) into ``dim`` buckets, with a hash bit as the sign so collisions
+    tend to cancel out.
+    """
+    import zlib
+
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in prompt_features(prompt):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    return vector
+
+
+class SceneLibrary:
+    """Scripts that rendered, indexed by prompt for few-shot retrieval.
+
+    Scenes (prompt, script, timestamps) and their hashed n-gram vectors, one
+    row per scene, are stored together in one ``.npz`` file. Lookups weight
+    the rows and the query by the library's IDF and rank by cosine
+    similarity, so words every prompt uses ("animate", "show") count for
+    little. Only a scene for the same prompt (see ``prompt_key``) is ever
+    reused or replaced; similar ones are just examples. Beyond
+    ``max_scenes`` the least recently used scenes are dropped.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_scenes: int = SCENE_LIBRARY_MAX_SCENES,
+        dim: int = SCENE_VECTOR_DIM,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.max_scenes = max_scenes
+        self.dim = dim
+        self.enabled = enabled
+        self.served = 0
+        self.examples_sent = 0
+        self.added = 0
+        self._scenes: list[dict] | None = None
+        self._vectors = None
+        self._weighted = None  # (IDF-weighted unit rows, IDF), until the next add
+        self._lock = threading.Lock()
+
+    def _load(self) -> list[dict]:
+        if self._scenes is None:
+            self._scenes, self._vectors = [], None
+            if self.path.exists():
+                import numpy as np
+
+                try:
+                    with np.load(self.path) as data:
+                        scenes = json.loads(str(data["scenes"]))
+                        vectors = data["vectors"]
+                    if vectors.shape == (len(scenes), self.dim):
+                        self._scenes, self._vectors = scenes, vectors
+                except (OSError, ValueError, KeyError):
+                    pass
+        return self._scenes
+
+    def _save(self):
+        import numpy as np
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(
+            f".{self.path.stem}.{os.getpid()}.{threading.get_ident()}.npz"
+        )
+        np.savez_compressed(
+            tmp, scenes=np.array(json.dumps(self._scenes)), vectors=self._vectors
+        )
+        os.replace(tmp, self.path)
+
+    def _similarities(self, prompt: str):
+        """Cosine similarity of ``prompt`` to every stored scene (lock held)."""
+        import numpy as np
+
+        if self._weighted is None:
+            df = np.count_nonzero(self._vectors, axis=0)
+            idf = np.log((len(self._scenes) + 1) / (df + 1)) + 1
+            weighted = self._vectors * idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            self._weighted = (weighted / np.maximum(norms, 1e-9), idf)
+        weighted, idf = self._weighted
+        query = prompt_vector(prompt, self.dim) * idf
+        norm = np.linalg.norm(query)
+        return weighted @ (query / norm) if norm else np.zeros(len(self._scenes))
+
+    def nearest(self, prompt: str, k: int) -> list[tuple[float, dict]]:
+        """The ``k`` stored scenes most similar to ``prompt``, best first."""
+        if not self.enabled or k <= 0:
+            return []
+        with self._lock:
+            scenes = self._load()
+            if not scenes:
+                return []
+            similarities = self._similarities(prompt)
+            best = similarities.argsort()[::-1][:k]
+            return [(float(similarities[i]), scenes[i]) for i in best]
+
+    def _find(self, key: str) -> int | None:
+        """Index of the stored scene whose prompt has this key (lock held)."""
+        for index, scene in enumerate(self._load()):
+            if prompt_key(scene["prompt"]) == key:
+                return index
+        return None
+
+    def lookup(self, prompt: str) -> str | None:
+        """The stored script for this very prompt, if there is one."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            index = self._find(prompt_key(prompt))
+            if index is None:
+                return None
+            scene = self._scenes[index]
+            scene["last_used"] = time.time()
+            self.served += 1
+            return scene["code"]
+
+    def examples(self, prompt: str, k: int = SCENE_EXAMPLES) -> list[dict]:
+        """Up to ``k`` similar stored scenes to show the LLM as examples."""
+        found = [
+            scene
+            for similarity, scene in self.nearest(prompt, k)
+            if similarity >= SCENE_EXAMPLE_MIN_SIMILARITY
+            and len(scene["code"]) <= SCENE_EXAMPLE_MAX_CHARS
+        ]
+        with self._lock:
+            for scene in found:
+                scene["last_used"] = time.time()
+            self.examples_sent += len(found)
+        return found
+
+    def add(self, prompt: str, code: str):
+        """Store the script that rendered for ``prompt``."""
+        if not self.enabled:
+            return
+        import numpy as np
+
+        now = time.time()
+        scene = {"prompt": prompt, "code": code, "added": now, "last_used": now}
+        vector = prompt_vector(prompt, self.dim)
+        with self._lock:
+            scenes = self._load()
+            index = self._find(prompt_key(prompt))
+            if index is not None:
+                scenes[index] = scene
+                self._vectors[index] = vector
+            else:
+                scenes.append(scene)
+                self._vectors = (
+                    vector[None]
+                    if self._vectors is None
+                    else np.vstack([self._vectors, vector])
+                )
+            if len(scenes) > self.max_scenes:
+                keep = sorted(
+                    sorted(
+                        range(len(scenes)),
+                        key=lambda i: scenes[i]["last_used"],
+                        reverse=True,
+                    )[: self.max_scenes]
+                )
+                self._scenes = [scenes[i] for i in keep]
+                self._vectors = self._vectors[keep]
+            self._weighted = None
+            self.added += 1
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "served": self.served,
+                "examples": self.examples_sent,
+                "added": self.added,
+                "scenes": len(self._load()),
+            }
+
+
+scene_library = SceneLibrary(
+    CACHE_DIR / "scene_library.npz",
+    enabled=os.getenv("AUTOMANIM_NO_CACHE", "") in ("", "0"),
+)
+
+
+# ── Segmented Rendering ──────────────────────────────────────────────────────
+
+# Animations counted by successful dry runs, keyed by ``RenderCache.key``.
+_scene_plays: dict[str, int] = {}
+
+
+def plan_segments(
+    plays: int, segments: int, min_plays: int = SEGMENT_MIN_PLAYS
+) -> list[tuple[int, int]]:
+    """Split animations ``0..plays-1`` into inclusive ranges for ``manim -n``.
+
+    At most ``segments`` ranges of at least ``min_plays`` animations each; an
+    empty list means the scene is too short to be worth splitting.
+    """
+    count = min(segments, plays // max(1, min_plays))
+    if count < 2:
+        return []
+    bounds = [round(i * plays / count) for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(count)]
+
+
+def segment_dir(script_path: Path, quality: str, index: int) -> Path:
+    """Stable ``--media_dir`` for one segment of ``script_path`` at ``quality``."""
+    return (
+        script_path.parent
+        / "media"
+        / "segments"
+        / script_path.stem
+        / QUALITY_DIRS[quality]
+        / f"{index:03d}"
+    )
+
+
+def concat_movies(parts: list[Path], target: Path) -> tuple[int, str]:
+    """Join ``parts`` into ``target`` with ffmpeg's concat demuxer (no re-encode).
+
+    Segments of one scene share codec and encoder settings, so the streams
+    are copied as they are. Returns (returncode, ffmpeg's error output).
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return 127, "ffmpeg not found on PATH"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    listing = target.with_name(f".{target.stem}.{os.getpid()}.concat.txt")
+    tmp = target.with_name(f".{target.stem}.{os.getpid()}{target.suffix}")
+    listing.write_text(
+        "".join(
+            "file '{}'\n".format(str(part.absolute()).replace("'", "'\\''"))
+            for part in parts
+        ),
+        encoding="utf-8",
+    )
+    try:
+        proc = subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0"]
+            + ["-i", str(listing), "-c", "copy", "-movflags", "+faststart", str(tmp)],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode == 0:
+            os.replace(tmp, target)
+        return proc.returncode, proc.stderr
+    finally:
+        listing.unlink(missing_ok=True)
+        tmp.unlink(missing_ok=True)
+
+
+def count_plays(
+    script_path: Path,
+    quality: str,
+    cancel: threading.Event | None = None,
+    limits: dict | None = None,
+    timeout: float | None = None,
+) -> int | None:
+    """Number of play()/wait() calls in GenScene, from a ``manim -s`` dry run."""
+    returncode, _, stderr = _run_manim(
+        [quality, "-s", script_path.name, "GenScene"],
+        str(script_path.parent.absolute()),
+        cancel,
+        limits,
+        timeout,
+    )
+    _, probe = _split_probe(stderr)
+    if returncode != 0 or probe is None:
+        return None
+    return probe.get("plays")
+
+
+def _render_segments(
+    script_path: Path,
+    quality: str,
+    ranges: list[tuple[int, int]],
+    cancel: threading.Event | None,
+    limits: dict | None,
+    timeout: float | None,
+) -> tuple[int, str, str] | None:
+    """Render ``ranges`` concurrently and join them; None if that didn't work.
+
+    Every segment is a separate manim process that replays the animations
+    before its range with frame output disabled (``-n``), so it starts from
+    the same scene state a serial render would have reached.
+    """
+    cwd = str(script_path.parent.absolute())
+    jobs = []
+    for index, (first, last) in enumerate(ranges):
+        # The last range is left open in case the count was off.
+        span = f"{first},{last}" if index < len(ranges) - 1 else str(first)
+        media_dir = segment_dir(script_path, quality, index).absolute()
+        args = [quality, "-n", span, "--media_dir", str(media_dir)]
+        jobs.append(args + [script_path.name, "GenScene"])
+
+    def render(index: int) -> tuple[int, str, str]:
+        media_dir = segment_dir(script_path, quality, index).absolute()
+        with partial_movies.checkout(script_path, quality, media_dir):
+            return _run_manim(jobs[index], cwd, cancel, limits, timeout)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        results = list(pool.map(render, range(len(jobs))))
+
+    stdout, stderr = [], []
+    totals = {"encode": 0.0, "cpu": 0.0, "animations": 0, "reused": 0}
+    reuse = []
+    for returncode, out, err in results:
+        err, probe = _split_probe(err)
+        if returncode != 0:
+            if cancel is not None and cancel.is_set():
+                return returncode, out, err
+            return None
+        probe = probe or {}
+        stdout.append(out)
+        stderr.append(err)
+        for key in totals:
+            totals[key] += probe.get(key, 0)
+        reuse.append(f"{probe.get('reused', 0)}/{probe.get('animations', 0)}")
+
+    parts = [
+        segment_dir(script_path, quality, index).absolute()
+        / "videos"
+        / script_path.stem
+        / QUALITY_DIRS[quality]
+        / "GenScene.mp4"
+        for index in range(len(ranges))
+    ]
+    if not all(part.exists() for part in parts):
+        return None
+    start = time.perf_counter()
+    returncode, error = concat_movies(parts, video_path(script_path, quality))
+    if returncode != 0:
+        return None
+    totals["encode"] += time.perf_counter() - start
+    probe = {**totals, "segments": len(ranges)}
+    stdout.append(
+        f"Joined {len(ranges)} segments into {video_path(script_path, quality)} "
+        f"(cached animations per segment: {', '.join(reuse)})"
+    )
+    return (
+        0,
+        "\n".join(stdout),
+        "\n".join(stderr) + f"\n{RENDER_PROBE_MARK}{json.dumps(probe)}\n",
+    )
+
+
+def render_movie(
+    script_path: Path,
+    quality: str = RENDER_QUALITY,
+    segments: int = 0,
+    plays: int | None = None,
+    cancel: threading.Event | None = None,
+    limits: dict | None = None,
+    timeout: float | None = None,
+) -> tuple[int, str, str]:
+    """Render GenScene to ``video_path(script_path, quality)``.
+
+    With ``segments`` > 1, a scene of ``plays`` animations (counted with a
+    dry run when not given) is split by ``plan_segments`` and rendered in
+    parallel by ``_render_segments``. Scenes too short to split, a failing
+    segment or a failed join fall back to one serial manim process. Returns
+    ``_run_manim``'s (returncode, stdout, stderr); module-level so it pickles.
+
+    Animations already in the job's ``partial_movies`` pool are not rendered
+    again.
+    """
+    if segments > 1:
+        if plays is None:
+            plays = count_plays(script_path, quality, cancel, limits, timeout)
+        ranges = plan_segments(plays or 0, segments)
+        if ranges:
+            result = _render_segments(
+                script_path, quality, ranges, cancel, limits, timeout
+            )
+            if result is not None:
+                return result
+    with partial_movies.checkout(script_path, quality):
+        return _run_manim(
+            [quality, script_path.name, "GenScene"],
+            str(script_path.parent.absolute()),
+            cancel,
+            limits,
+            timeout,
+        )
+
+
+# ── Quality Ladder ───────────────────────────────────────────────────────────
+
+
+class QualityLadder:
+    """Background re-renders of validated scripts at production qualities.
+
+    The heal loop only ever pays for the cheap ``RENDER_QUALITY`` render.
+    Scripts that pass are handed to ``submit``, which queues one render per
+    quality in ``FINAL_QUALITIES`` on a spawned process pool and returns
+    immediately. Renders are reported as they finish to the reporter that
+    was current at ``submit``, and each script's directory gets a
+    ``renders.json`` manifest tracking status and output paths. Results are
+    stored in (and served from) ``render_cache``, and finished videos are
+    handed on to ``artifacts`` when it is given.
+    """
+
+    def __init__(
+        self,
+        qualities: list[str],
+        workers: int | None = None,
+        artifacts: ArtifactPipeline | None = None,
+    ):
+        self.qualities = qualities
+        self.artifacts = artifacts
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 2)
+        self.entries: dict[Path, dict[str, dict]] = {}
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(self, script_path: Path) -> dict[str, dict]:
+        """Queue ``script_path`` for every final quality; returns its entries."""
+        code = script_path.read_text(encoding="utf-8")
+        entries = self.entries.setdefault(script_path, {})
+        run = current_run()
+        reporter = current_reporter()
+        for quality in self.qualities:
+            entry = {
+                "quality": QUALITY_DIRS[quality],
+                "status": "queued",
+                "video": str(video_path(script_path, quality)),
+                "queued_at": time.time(),
+            }
+            entries[quality] = entry
+
+            cache_key = RenderCache.key(code, quality)
+            cached = render_cache.get(cache_key)
+            if cached and cached[0] == 0 and cached[2] is not None:
+                target = video_path(script_path, quality)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(cached[2], target)
+                entry.update(status="done", cached=True, elapsed=0.0)
+                self._report(script_path, entry, reporter)
+                if self.artifacts is not None:
+                    self.artifacts.submit(script_path, target, run)
+                continue
+
+            with self._lock:
+                self._pending += 1
+            future = self._get_pool().submit(
+                render_movie,
+                script_path,
+                quality,
+                SEGMENTS,
+                _scene_plays.get(RenderCache.key(code)),
+                None,
+                render_limits(),
+                FINAL_RENDER_TIMEOUT,
+            )
+            future.add_done_callback(
+                lambda f, p=script_path, q=quality, k=cache_key: self._finished(
+                    f, p, q, k, run, reporter
+                )
+            )
+        self._write_manifest(script_path)
+        return entries
+
+    def _finished(
+        self,
+        future,
+        script_path: Path,
+        quality: str,
+        cache_key: str,
+        run: RunMetrics | None = None,
+        reporter: Reporter | None = None,
+    ):
+        entry = self.entries[script_path][quality]
+        entry["elapsed"] = round(time.time() - entry["queued_at"], 2)
+        try:
+            returncode, _, stderr = future.result()
+        except Exception as e:
+            returncode, stderr = -1, str(e)
+        stderr, probe = _split_probe(stderr)
+        probe = probe or {}
+        record_stage(
+            "final_render",
+            entry["elapsed"],
+            probe.get("cpu", 0.0),
+            run=run,
+            quality=entry["quality"],
+            returncode=returncode,
+        )
+        if probe.get("encode"):
+            record_stage("encode", probe["encode"], run=run, quality=entry["quality"])
+        if probe.get("reused"):
+            entry["reused"] = f"{probe['reused']}/{probe.get('animations', 0)}"
+
+        video = video_path(script_path, quality)
+        if returncode == 0 and video.exists():
+            entry["status"] = "done"
+            render_cache.put(cache_key, 0, "", video)
+            if self.artifacts is not None:
+                self.artifacts.submit(script_path, video, run)
+        else:
+            entry["status"] = "failed"
+            entry["error"] = "\n".join(stderr.strip().splitlines()[-5:])
+        with self._lock:
+            self._pending -= 1
+        self._report(script_path, entry, reporter)
+
+    def _report(self, script_path: Path, entry: dict, reporter: Reporter | None):
+        # Pool callbacks run on the executor's thread, outside the context
+        # ``submit`` was called in, so the reporter is passed along.
+        (reporter or current_reporter()).emit(
+            "final_render",
+            quality=entry["quality"],
+            status=entry["status"],
+            path=entry["video"] if entry["status"] == "done" else str(script_path),
+            elapsed=entry.get("elapsed", 0.0),
+            cached=entry.get("cached", False),
+            reused=entry.get("reused", ""),
+            pending=self._pending,
+        )
+        self._write_manifest(script_path)
+
+    def _write_manifest(self, script_path: Path):
+        """Rewrite ``renders.json`` for every script in ``script_path``'s directory."""
+        directory = script_path.parent
+        with self._lock:
+            data = {
+                path.name: {
+                    QUALITY_DIRS[quality]: {
+                        k: v for k, v in entry.items() if k != "queued_at"
+                    }
+                    for quality, entry in qualities.items()
+                }
+                for path, qualities in self.entries.items()
+                if path.parent == directory
+            }
+            manifest = directory / "renders.json"
+            tmp = manifest.with_name(".renders.json.tmp")
+            tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            os.replace(tmp, manifest)
+
+    def wait(self):
+        """Block until every queued render has finished."""
+        if self._pool is None:
+            return
+        if self._pending:
+            print_step(
+                "◆",
+                "Final renders",
+                f"waiting for {self._pending} background render(s)…",
+                style="bright_cyan",
+            )
+        self._pool.shutdown(wait=True)
+        self._pool = None
+
+
+# ── Artifact Pipeline ────────────────────────────────────────────────────────
+
+
+def parse_artifacts(spec: str) -> dict[str, dict]:
+    """Presets for an ``--artifacts`` list such as ``"poster,web=8M,gif=2M"``.
+
+    A size after ``=`` (bytes, or with a K/M/G suffix) replaces the preset's
+    budget; ``=0`` removes it. Raises ValueError for unknown presets or sizes.
+    """
+    presets = {}
+    for item in spec.split(","):
+        name, _, size = item.strip().partition("=")
+        if not name:
+            continue
+        if name not in ARTIFACT_PRESETS:
+            raise ValueError(f"unknown artifact preset '{name}'")
+        preset = dict(ARTIFACT_PRESETS[name])
+        if size:
+            match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?)i?B?", size.strip(), re.I)
+            if match is None:
+                raise ValueError(f"bad size '{size}' for artifact preset '{name}'")
+            scale = 1 << (10 * " KMG".index(match.group(2).upper() or " "))
+            preset["max_bytes"] = int(float(match.group(1)) * scale)
+        presets[name] = preset
+    return presets
+
+
+def _artifact_command(
+    ffmpeg: str, source: Path, target: Path, preset: dict, width: int, quality: int
+) -> list[str]:
+    """ffmpeg arguments that turn ``source`` into ``preset``'s format."""
+    scale = f"scale='min({width},iw)':-2"
+    args = [ffmpeg, "-y", "-loglevel", "error"]
+    fmt = preset["format"]
+    if fmt == "jpg":
+        # Poster frames come from the end, where the scene is fully built up.
+        args += ["-sseof", "-0.5", "-i", str(source), "-frames:v", "1"]
+        args += ["-vf", scale, "-q:v", str(quality)]
+    elif fmt == "gif":
+        graph = (
+            f"fps={preset['fps']},{scale}:flags=lanczos,split[a][b];"
+            "[a]palettegen=stats_mode=diff[p];[b][p]paletteuse"
+        )
+        args += ["-i", str(source), "-vf", graph, "-loop", "0"]
+    elif fmt == "webm":
+        args += ["-i", str(source), "-vf", scale, "-c:v", "libvpx-vp9"]
+        args += ["-crf", str(quality), "-b:v", "0", "-row-mt", "1", "-c:a", "libopus"]
+    else:
+        args += ["-i", str(source), "-vf", scale, "-c:v", "libx264"]
+        args += ["-preset", "medium", "-crf", str(quality), "-pix_fmt", "yuv420p"]
+        args += ["-c:a", "aac", "-movflags", "+faststart"]
+    return args + [str(target)]
+
+
+def _file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def build_artifact(source: Path, name: str, preset: dict, root: Path) -> dict:
+    """Encode ``source`` per ``preset`` into the content-addressed store at ``root``.
+
+    Outputs over ``preset["max_bytes"]`` are re-encoded at a lower quality and
+    three quarters of the width (and fewer frames per second for GIFs) until
+    they fit or ``ARTIFACT_BUDGET_RETRIES`` runs out; the last attempt is kept
+    either way and flagged ``over_budget``. The result is stored as
+    ``<sha256>.<format>`` and indexed by the source's hash and the preset, so
+    the same video is never encoded twice with the same settings. Runs in the
+    pipeline's worker processes.
+    """
+    started = time.time()
+    key = hashlib.sha256(
+        (_file_digest(source) + json.dumps(preset, sort_keys=True)).encode("utf-8")
+    ).hexdigest()
+    index = root / "index" / f"{key}.json"
+    try:
+        stored = json.loads(index.read_text(encoding="utf-8"))
+        if Path(stored["path"]).exists():
+            return {**stored, "cached": True, "elapsed": 0.0}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return {"status": "failed", "error": "ffmpeg not found on PATH"}
+    fmt = preset["format"]
+    work = root / "tmp"
+    work.mkdir(parents=True, exist_ok=True)
+    tmp = work / f"{key[:16]}.{os.getpid()}.{name}.{fmt}"
+    preset = dict(preset)
+    width, quality = preset["width"], preset.get("quality", 0)
+    budget = preset.get("max_bytes") or 0
+    try:
+        for attempt in range(ARTIFACT_BUDGET_RETRIES + 1):
+            try:
+                proc = subprocess.run(
+                    _artifact_command(ffmpeg, source, tmp, preset, width, quality),
+                    capture_output=True,
+                    text=True,
+                    timeout=ARTIFACT_TIMEOUT,
+                )
+            except subprocess.TimeoutExpired:
+                return {"status": "failed", "error": "encode timed out"}
+            if proc.returncode != 0 or not tmp.exists():
+                error = "\n".join(proc.stderr.strip().splitlines()[-5:])
+                return {"status": "failed", "error": error or "no output"}
+            size = tmp.stat().st_size
+            if not budget or size <= budget or attempt == ARTIFACT_BUDGET_RETRIES:
+                break
+            width = max(64, int(width * 0.75) // 2 * 2)
+            quality = min(31 if fmt == "jpg" else 51, quality + 4)
+            if "fps" in preset:
+                preset["fps"] = max(6, preset["fps"] - 3)
+
+        digest = _file_digest(tmp)
+        blob = root / digest[:2] / f"{digest}.{fmt}"
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, blob)  # identical outputs land on the same blob
+        result = {
+            "status": "done",
+            "path": str(blob.absolute()),
+            "sha256": digest,
+            "bytes": size,
+            "encodes": attempt + 1,
+            "over_budget": bool(budget) and size > budget,
+        }
+        index.parent.mkdir(parents=True, exist_ok=True)
+        tmp_index = index.with_name(f".{index.name}.{os.getpid()}")
+        tmp_index.write_text(json.dumps(result), encoding="utf-8")
+        os.replace(tmp_index, index)
+        return {**result, "elapsed": round(time.time() - started, 2)}
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _publish(blob: Path, target: Path):
+    """Atomically place ``blob`` at ``target`` (hard link, or copy)."""
+    if target.exists() and os.path.samefile(blob, target):
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        os.link(blob, tmp)
+    except OSError:  # another filesystem, or no hard links
+        shutil.copyfile(blob, tmp)
+    try:
+        os.replace(tmp, target)
+    finally:
+        # rename() leaves both names alone if they already are the same file.
+        tmp.unlink(missing_ok=True)
+
+
+class ArtifactPipeline:
+    """Background post-processing of rendered videos into shareable files.
+
+    ``submit`` queues one ``build_artifact`` per preset (poster frames,
+    thumbnails, web MP4/WebM, GIF previews) on a spawned process pool and
+    returns immediately, so the next job never waits on an encode. Outputs
+    live in a content-addressed store under ``root``; each finished one is
+    linked into its script's directory as ``artifacts/<quality>/<preset>.<ext>``
+    and listed in the ``artifacts.json`` manifest there.
+    """
+
+    def __init__(
+        self,
+        presets: dict[str, dict],
+        root: Path = ARTIFACT_DIR,
+        workers: int | None = None,
+    ):
+        self.presets = presets
+        self.root = root
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 4)
+        self.entries: dict[Path, dict[str, dict]] = {}
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(
+        self, script_path: Path, video: Path, run: RunMetrics | None = None
+    ) -> dict[str, dict]:
+        """Queue every preset for ``video``, rendered from ``script_path``.
+
+        Each artifact is reported as it finishes to the reporter that is
+        current here.
+        """
+        run = run or current_run()
+        reporter = current_reporter()
+        quality = video.parent.name
+        with self._lock:
+            entries = self.entries.setdefault(video, {})
+            for name, preset in self.presets.items():
+                entries[name] = {
+                    "script": str(script_path),
+                    "quality": quality,
+                    "status": "queued",
+                    "file": str(
+                        script_path.parent
+                        / "artifacts"
+                        / quality
+                        / f"{name}.{preset['format']}"
+                    ),
+                    "queued_at": time.time(),
+                }
+                self._pending += 1
+        for name, preset in self.presets.items():
+            future = self._get_pool().submit(
+                build_artifact, video.absolute(), name, preset, self.root.absolute()
+            )
+            future.add_done_callback(
+                lambda f, v=video, n=name: self._finished(f, v, n, run, reporter)
+            )
+        self._write_manifest(script_path.parent)
+        return entries
+
+    def _finished(
+        self,
+        future,
+        video: Path,
+        name: str,
+        run: RunMetrics | None,
+        reporter: Reporter | None = None,
+    ):
+        entry = self.entries[video][name]
+        elapsed = round(time.time() - entry["queued_at"], 2)
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+        if result["status"] == "done":
+            try:
+                _publish(Path(result["path"]), Path(entry["file"]))
+            except OSError as e:
+                result = {"status": "failed", "error": str(e)}
+        entry.update(result, elapsed=elapsed)
+        record_stage(
+            "artifact",
+            elapsed,
+            run=run,
+            preset=name,
+            status=entry["status"],
+            bytes=entry.get("bytes", 0),
+            cached=entry.get("cached", False),
+        )
+        with self._lock:
+            self._pending -= 1
+        (reporter or current_reporter()).emit(
+            "artifact",
+            preset=name,
+            status=entry["status"],
+            file=entry["file"],
+            size=entry.get("bytes", 0),
+            elapsed=elapsed,
+            cached=entry.get("cached", False),
+            over_budget=entry.get("over_budget", False),
+            error=entry.get("error", ""),
+            pending=self._pending,
+        )
+        self._write_manifest(Path(entry["script"]).parent)
+
+    def _write_manifest(self, directory: Path):
+        """Rewrite ``artifacts.json`` for every video rendered in ``directory``."""
+        with self._lock:
+            data = {}
+            for entries in self.entries.values():
+                for name, entry in entries.items():
+                    if Path(entry["script"]).parent != directory:
+                        continue
+                    data.setdefault(entry["quality"], {})[name] = {
+                        k: v
+                        for k, v in entry.items()
+                        if k not in ("queued_at", "quality", "script")
+                    }
+            manifest = directory / "artifacts.json"
+            tmp = manifest.with_name(".artifacts.json.tmp")
+            tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            os.replace(tmp, manifest)
+
+    def wait(self):
+        """Block until every queued artifact has been built."""
+        if self._pool is None:
+            return
+        if self._pending:
+            print_step(
+                "◆",
+                "Artifacts",
+                f"waiting for {self._pending} background encode(s)…",
+                style="bright_cyan",
+            )
+        self._pool.shutdown(wait=True)
+        self._pool = None
+
+
+# ── Self-Healing Loop ────────────────────────────────────────────────────────
+
+
+def self_healing_loop(
+    code: str,
+    prompt: str,
+    output_file: Path,
+    render_pool: Executor | None = None,
+) -> bool:
+    """
+    Attempt to render the scene. If it fails, send the error back to the LLM
+    to generate a fix. Repeat up to MAX_HEAL_ATTEMPTS times.
+
+    Known failures are first matched against ``fix_memory``; a deterministic
+    repair from there replaces the LLM call for that attempt. Heals escalate
+    through the model tiers, and whether each model's script passed is
+    recorded in ``model_stats``.
+
+    Returns True if the scene was eventually rendered successfully.
+    """
+    current_code = code
+    pending = None  # the heal that produced current_code, for fix_memory
+    author = last_model()  # the model that wrote current_code, if any
+
+    for attempt in range(MAX_HEAL_ATTEMPTS + 1):  # 0 = initial, 1..N = fix attempts
+        # ── Pre-flight validation ─────────────────────────────────────
+        with timed("validate", attempt=attempt):
+            syntax_ok, syntax_err = validate_code_syntax(current_code)
+            scene_ok, scene_err = (
+                validate_scene_class(current_code) if syntax_ok else (False, "")
+            )
+            api_ok, api_report = (
+                validate_manim_api(current_code) if scene_ok else (True, "")
+            )
+            known_error = (
+                render_cache.known_failure(current_code)
+                if scene_ok and api_ok
+                else None
+            )
+        if not syntax_ok:
+            if attempt == 0:
+                print_error(f"Generated code has a syntax error: {syntax_err}")
+            else:
+                print_error(f"Fixed code still has a syntax error: {syntax_err}")
+            error_output = syntax_err
+        else:
+            if not scene_ok:
+                print_error(scene_err)
+                error_output = scene_err
+            elif not api_ok:
+                print_error(api_report.splitlines()[0].rstrip(":"))
+                error_output = api_report
+            elif known_error is not None:
+                print_step(
+                    "↺",
+                    "Known failure",
+                    "this exact script already failed to render — skipping render",
+                    style="bright_yellow",
+                )
+                error_output = known_error
+            else:
+                # ── Save and render ───────────────────────────────
+                output_file.write_text(current_code, encoding="utf-8")
+                if attempt == 0:
+                    print_step(
+                        "◆",
+                        "Saved to",
+                        str(output_file.absolute()),
+                        style="bright_cyan",
+                    )
+                else:
+                    print_step(
+                        "◆",
+                        "Updated",
+                        str(output_file.absolute()),
+                        style="bright_cyan",
+                    )
+
+                # Show code preview
+                print_blank()
+                print_code_preview(current_code, output_file.name)
+                print_blank()
+
+                # Cheap runtime check first, full render only once it passes
+                returncode = 0
+                if DRY_RUN_VALIDATION:
+                    returncode, error_output = dry_run_scene(output_file, render_pool)
+
+                if returncode == 0:
+                    returncode, error_output = render_scene(output_file, render_pool)
+
+                if returncode == 0:
+                    fix_memory.settle(pending, current_code, None)
+                    scene_library.add(prompt, current_code)
+                    if author:
+                        model_stats.record_outcome(author, True)
+                    if attempt > 0:
+                        print_heal_success(attempt)
+                    return True
+
+        # ── Render failed — attempt healing ───────────────────────────
+        fix_memory.settle(pending, current_code, error_output)
+        if author:
+            model_stats.record_outcome(author, False)
+        if attempt >= MAX_HEAL_ATTEMPTS:
+            # No more attempts left
+            break
+
+        # Show error details
+        if error_output:
+            print_error_summary(error_output, current_code)
+
+        heal_attempt = attempt + 1
+        print_heal_attempt(heal_attempt, MAX_HEAL_ATTEMPTS)
+
+        with timed("fix_memory", attempt=heal_attempt) as sample:
+            repair = fix_memory.repair(current_code, error_output)
+            sample["hit"] = repair is not None
+        if repair is not None:
+            repaired_code, applied = repair
+            print_step(
+                "↺",
+                "Fix memory",
+                "; ".join(_describe_rule(item["rule"]) for item in applied),
+                style="bright_blue",
+            )
+            pending = {"code": current_code, "error": error_output, "applied": applied}
+            current_code = repaired_code
+            author = None
+            continue
+
+        try:
+            fixed_code = fix_code(
+                current_code, error_output, prompt, failed_heals=attempt
+            )
+        except Exception as e:
+            print_error(f"Failed to call LLM for fix: {e}")
+            break
+
+        fixed_code = clean_code(fixed_code)
+
+        if not fixed_code:
+            print_error("The model returned empty fix output.")
+            break
+
+        pending = {"code": current_code, "error": error_output, "applied": None}
+        current_code = fixed_code
+        author = last_model()
+
+    # All attempts exhausted
+    print_heal_failure()
+    return False
+
+
+def _authored(fn, *args) -> tuple[str, str | None]:
+    """``fn(*args)`` and the model that answered, for calls in a copied context."""
+    return fn(*args), last_model()
+
+
+def generate_candidates(prompt: str, candidates: int) -> list[tuple[str, str | None]]:
+    """Generate ``candidates`` scripts for ``prompt`` with concurrent LLM calls.
+
+    Returns (script, model) pairs; the model is None for a script served from
+    the scene library.
+    """
+    if candidates <= 1:
+        return [(clean_code(generate_code(prompt)), last_model())]
+    print_step("◆", "Speculative", f"generating {candidates} candidates in parallel")
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=candidates) as pool:
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                _authored,
+                generate_code,
+                prompt,
+                variant,
+                False,
+            )
+            for variant in range(candidates)
+        ]
+        codes = []
+        for future in futures:
+            try:
+                code, model = future.result()
+            except Exception as e:
+                print_error(f"Candidate generation failed: {e}")
+                continue
+            codes.append((clean_code(code), model))
+    return [(code, model) for code, model in codes if code]
+
+
+def speculative_healing_loop(
+    codes: list[tuple[str, str | None]],
+    prompt: str,
+    output_file: Path,
+    candidates: int = SPECULATIVE_CANDIDATES,
+    render_pool: Executor | None = None,
+) -> bool:
+    """
+    Speculative variant of ``self_healing_loop``.
+
+    Every round renders all candidate scripts in parallel, each from its own
+    ``<stem>_c<i>.py`` file; the first successful render wins, is copied to
+    ``output_file`` and the remaining renders are cancelled. As soon as a
+    candidate fails, a fix for it is requested in the background while the
+    other renders are still running, so the next round's candidates are
+    usually ready when the current round ends. Each round produces up to
+    ``candidates`` new scripts. ``codes`` are (script, model) pairs; as in
+    ``self_healing_loop``, every candidate that is validated or rendered to
+    the end settles its heal in ``fix_memory`` and its model's outcome in
+    ``model_stats``.
+
+    Returns True if any candidate was eventually rendered successfully.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # (script, model that wrote it, the heal that produced it)
+    current = [(code, author, None) for code, author in codes]
+    candidate_files: list[Path] = []
+    pool = ThreadPoolExecutor(max_workers=candidates * 2)
+
+    def request_fix(code: str, error_output: str, variant: int):
+        future = pool.submit(
+            contextvars.copy_context().run,
+            _authored,
+            fix_code,
+            code,
+            error_output,
+            prompt,
+            variant,
+            False,
+            attempt,
+        )
+        return future, {"code": code, "error": error_output, "applied": None}
+
+    def settle(code: str, author: str | None, pending, error_output: str | None):
+        fix_memory.settle(pending, code, error_output)
+        if author:
+            model_stats.record_outcome(author, error_output is None)
+
+    try:
+        for attempt in range(MAX_HEAL_ATTEMPTS + 1):
+            can_heal = attempt < MAX_HEAL_ATTEMPTS
+            failures: list[tuple[str, str]] = []
+            fixes = []
+
+            # ── Pre-flight validation ─────────────────────────────────
+            renderable: list[tuple[str, str | None, dict | None, Path]] = []
+            for code, author, pending in current:
+                with timed("validate", attempt=attempt):
+                    ok, err = validate_code_syntax(code)
+                    if ok:
+                        ok, err = validate_scene_class(code)
+                    if ok:
+                        ok, err = validate_manim_api(code)
+                    if ok:
+                        known = render_cache.known_failure(code)
+                        if known is not None:
+                            ok, err = False, known
+                if not ok:
+                    settle(code, author, pending, err)
+                    failures.append((code, err))
+                    if can_heal:
+                        fixes.append(request_fix(code, err, len(fixes)))
+                    continue
+                path = output_file.with_name(
+                    f"{output_file.stem}_c{len(renderable)}{output_file.suffix}"
+                )
+                path.write_text(code, encoding="utf-8")
+                candidate_files.append(path)
+                renderable.append((code, author, pending, path))
+
+            # ── Race the renders ──────────────────────────────────────
+            if renderable:
+                print_blank()
+                print_step(
+                    "▶",
+                    "Racing renders",
+                    f"{len(renderable)} candidates · manim {RENDER_QUALITY} GenScene",
+                    style="bright_yellow",
+                )
+                cancel = threading.Event()
+                render_threads = ThreadPoolExecutor(max_workers=len(renderable))
+                try:
+                    futures = {
+                        render_threads.submit(
+                            contextvars.copy_context().run,
+                            checked_render,
+                            path,
+                            render_pool,
+                            cancel,
+                        ): i
+                        for i, (_, _, _, path) in enumerate(renderable)
+                    }
+                    for future in as_completed(futures):
+                        code, author, pending, path = renderable[futures[future]]
+                        returncode, _, error_output, cached = future.result()
+                        if returncode == 0 and not cancel.is_set():
+                            cancel.set()
+                            settle(code, author, pending, None)
+                            output_file.write_text(code, encoding="utf-8")
+                            target = video_path(output_file)
+                            target.parent.mkdir(parents=True, exist_ok=True)
+                            if video_path(path).exists():
+                                shutil.copyfile(video_path(path), target)
+                            print_success(
+                                f"Candidate {futures[future] + 1} won the race"
+                                + (" (cached)" if cached else "")
+                            )
+                            print_step(
+                                "◆",
+                                "Saved to",
+                                str(output_file.absolute()),
+                                style="bright_cyan",
+                            )
+                            print_blank()
+                            print_code_preview(code, output_file.name)
+                            scene_library.add(prompt, code)
+                            if attempt > 0:
+                                print_heal_success(attempt)
+                            return True
+                        if returncode != 0 and not cancel.is_set():
+                            print_step(
+                                "✗",
+                                f"Candidate {futures[future] + 1} failed",
+                                f"exit code {returncode}",
+                                style="bright_red",
+                            )
+                            settle(code, author, pending, error_output)
+                            failures.append((code, error_output))
+                            # Prefetch its fix while the other renders run.
+                            if can_heal:
+                                fixes.append(
+                                    request_fix(code, error_output, len(fixes))
+                                )
+                finally:
+                    # Losing renders are killed via ``cancel``; don't wait on them.
+                    render_threads.shutdown(wait=False)
+
+            # ── Every candidate failed — collect the next round ───────
+            if not can_heal or not failures:
+                break
+
+            print_error_summary(failures[0][1], failures[0][0])
+            print_heal_attempt(attempt + 1, MAX_HEAL_ATTEMPTS)
+            # Top up so each round still fields ``candidates`` scripts.
+            while len(fixes) < candidates:
+                code, error_output = failures[len(fixes) % len(failures)]
+                fixes.append(request_fix(code, error_output, len(fixes)))
+
+            current = []
+            for future, pending in fixes:
+                try:
+                    fixed, author = future.result()
+                except Exception as e:
+                    print_error(f"Failed to call LLM for fix: {e}")
+                    continue
+                fixed = clean_code(fixed)
+                if fixed and all(fixed != code for code, _, _ in current):
+                    current.append((fixed, author, pending))
+            if not current:
+                print_error("The model returned no usable fixes.")
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for path in candidate_files:
+            path.unlink(missing_ok=True)
+
+    print_heal_failure()
+    return False
+
+
+# ── Batch Mode ───────────────────────────────────────────────────────────────
+
+
+def read_batch_prompts(source: str) -> list[dict]:
+    """Read jobs from a JSONL or plain-text file, or stdin when ``source`` is '-'.
+
+    JSONL lines are objects with a ``prompt`` and an optional ``id``; any other
+    non-empty line that isn't a ``#`` comment is taken as a prompt verbatim.
+    Ids become file names, so they are reduced to word characters, dots and
+    dashes without leading dots, and repeats get a ``-2``, ``-3``... suffix.
+    Raises ValueError naming the line of a malformed JSONL entry.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(source).read_text(encoding="utf-8").splitlines()
+
+    jobs = []
+    seen = set()
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        job_id = ""
+        if line.startswith("{"):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {lineno}: invalid JSON ({e.msg})") from e
+            if not isinstance(entry, dict):
+                raise ValueError(f"line {lineno}: expected a JSON object")
+            prompt = str(entry.get("prompt", "")).strip()
+            job_id = re.sub(r"[^\w.-]", "_", str(entry.get("id") or "")).lstrip(".")
+        else:
+            prompt = line
+        if not prompt:
+            continue
+        job_id = job_id or f"job-{len(jobs) + 1:04d}"
+        unique, n = job_id, 1
+        while unique in seen:
+            n += 1
+            unique = f"{job_id}-{n}"
+        seen.add(unique)
+        jobs.append({"id": unique, "prompt": prompt})
+    return jobs
+
+
+def run_batch_job(
+    job: dict,
+    out_dir: Path,
+    render_pool: Executor | None,
+    candidates: int = SPECULATIVE_CANDIDATES,
+    ladder: QualityLadder | None = None,
+    run: RunMetrics | None = None,
+    artifacts: ArtifactPipeline | None = None,
+) -> dict:
+    """Generate and self-heal one batch job inside its own working directory.
+
+    The passing video goes to ``ladder`` for final renders, or else straight
+    to ``artifacts``; either way this returns without waiting for them.
+    """
+    job_dir = out_dir / job["id"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+    output_file = job_dir / "generated_scene.py"
+    record = {"id": job["id"], "prompt": job["prompt"], "dir": str(job_dir)}
+    start = time.time()
+    token = _current_run.set(run)
+
+    try:
+        codes = generate_candidates(job["prompt"], candidates)
+        if not codes:
+            raise ValueError("The model returned empty output.")
+        if candidates > 1:
+            success = speculative_healing_loop(
+                codes, job["prompt"], output_file, candidates, render_pool
+            )
+        else:
+            success = self_healing_loop(
+                codes[0][0], job["prompt"], output_file, render_pool=render_pool
+            )
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    else:
+        record["status"] = "success" if success else "failed"
+        if output_file.exists():
+            record["script"] = str(output_file)
+        if success:
+            record["video"] = str(video_path(output_file))
+            if ladder is not None:
+                ladder.submit(output_file)
+            elif artifacts is not None:
+                artifacts.submit(output_file, video_path(output_file), run)
+    finally:
+        _current_run.reset(token)
+
+    record["elapsed"] = round(time.time() - start, 2)
+    if run is not None:
+        run.finish(record["status"] == "success")
+        record["metrics"] = run.summary()
+    return record
+
+
+def write_manifest(out_dir: Path, records: list[dict]):
+    """Atomically (re)write the batch summary manifest."""
+    manifest = out_dir / "manifest.json"
+    tmp = manifest.with_name(".manifest.json.tmp")
+    tmp.write_text(
+        json.dumps(
+            {
+                "jobs": sorted(records, key=lambda r: r["id"]),
+                "succeeded": sum(r["status"] == "success" for r in records),
+                "total": len(records),
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    os.replace(tmp, manifest)
+
+
+def run_batch(
+    source: str,
+    out_dir: Path = BATCH_OUTPUT_DIR,
+    llm_workers: int = BATCH_LLM_WORKERS,
+    render_workers: int | None = None,
+    candidates: int = SPECULATIVE_CANDIDATES,
+    ladder: QualityLadder | None = None,
+    artifacts: ArtifactPipeline | None = None,
+) -> bool:
+    """Process every prompt in ``source`` concurrently.
+
+    Each job drives its own generate → render → heal loop on a thread from the
+    LLM pool; the manim renders those loops request are funnelled through a
+    separate process pool sized to the CPU count. Per-job output from the
+    shared console is suppressed and a one-line status is printed as each job
+    finishes. Returns True if every job succeeded.
+    """
+    try:
+        jobs = read_batch_prompts(source)
+    except ValueError as e:
+        print_error(f"Bad batch input: {e}")
+        return False
+    if not jobs:
+        print_error("No prompts found in batch input.")
+        return False
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    render_workers = render_workers or os.cpu_count() or 1
+    print_step(
+        "◆",
+        "Batch",
+        f"{len(jobs)} jobs · {llm_workers} LLM workers · {render_workers} render workers",
+    )
+    print_step("◆", "Output", str(out_dir.absolute()))
+    console.print()
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    status_console = Console()
+    records = []
+    runs = {job["id"]: RunMetrics(job=job["id"], batch=out_dir.name) for job in jobs}
+    console.quiet = True
+    try:
+        if RENDER_BACKEND == "worker":
+            # The worker pool is already a bounded set of render processes.
+            get_render_workers(render_workers)
+            pool_context = contextlib.nullcontext()
+        else:
+            pool_context = ProcessPoolExecutor(
+                max_workers=render_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        with (
+            pool_context as render_pool,
+            ThreadPoolExecutor(max_workers=llm_workers) as llm_pool,
+        ):
+            futures = {
+                llm_pool.submit(
+                    run_batch_job,
+                    job,
+                    out_dir,
+                    render_pool,
+                    candidates,
+                    ladder,
+                    runs[job["id"]],
+                    artifacts,
+                ): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                write_manifest(out_dir, records)
+
+                ok = record["status"] == "success"
+                line = Text()
+                line.append(
+                    " ✓ " if ok else " ✗ ",
+                    style="bold bright_green" if ok else "bold bright_red",
+                )
+                line.append(f"[{len(records)}/{len(jobs)}] ", style="dim white")
+                line.append(record["id"], style="bold white")
+                line.append(
+                    f"  {record['status']} in {record['elapsed']:.1f}s",
+                    style="dim white",
+                )
+                status_console.print(line)
+    finally:
+        console.quiet = False
+
+    if ladder is not None:
+        ladder.wait()
+        for record in records:
+            finals = ladder.entries.get(Path(record.get("script", "")))
+            if finals:
+                record["final_renders"] = {
+                    entry["quality"]: {
+                        "status": entry["status"],
+                        "video": entry["video"],
+                    }
+                    for entry in finals.values()
+                }
+            # Final renders are recorded on their job's run as they finish.
+            record["metrics"] = runs[record["id"]].summary()
+        write_manifest(out_dir, records)
+
+    if artifacts is not None:
+        artifacts.wait()
+        for record in records:
+            built = {}
+            for entries in artifacts.entries.values():
+                for name, entry in entries.items():
+                    if entry["script"] == record.get("script"):
+                        built.setdefault(entry["quality"], {})[name] = {
+                            "status": entry["status"],
+                            "file": entry["file"],
+                        }
+            if built:
+                record["artifacts"] = built
+            record["metrics"] = runs[record["id"]].summary()
+        write_manifest(out_dir, records)
+
+    for run in runs.values():
+        run.write(METRICS_DIR)
+    summary = aggregate_metrics([run.to_dict() for run in runs.values()])
+    (out_dir / "metrics.json").write_text(
+        json.dumps(summary, indent=2), encoding="utf-8"
+    )
+
+    succeeded = sum(r["status"] == "success" for r in records)
+    table = Table(box=box.ROUNDED, border_style="bright_black")
+    table.add_column("Job", style="bold white")
+    table.add_column("Status")
+    table.add_column("Time", justify="right")
+    table.add_column("Output", style="dim white")
+    for record in sorted(records, key=lambda r: r["id"]):
+        style = "bright_green" if record["status"] == "success" else "bright_red"
+        table.add_row(
+            record["id"],
+            f"[{style}]{record['status']}[/{style}]",
+            f"{record['elapsed']:.1f}s",
+            record.get("video") or record.get("error", ""),
+        )
+    console.print()
+    console.print(table)
+    print_step(
+        "◆",
+        "Manifest",
+        f"{out_dir / 'manifest.json'}  ({succeeded}/{len(records)} succeeded)",
+    )
+    print_metrics_summary(summary)
+    print_cache_stats()
+    return succeeded == len(records)
+
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+
+def print_run_metrics(run: RunMetrics, path: Path | None = None):
+    """One-line breakdown of where a run's time and tokens went."""
+    summary = run.summary()
+    parts = [
+        f"{stage} {totals['wall']:.1f}s"
+        + (f" ×{totals['count']}" if totals["count"] > 1 else "")
+        for stage, totals in summary["stages"].items()
+        if stage != "clean"
+    ]
+    if summary["tokens"]["total"]:
+        parts.append(f"{summary['tokens']['total']:,} tokens")
+    print_step("◆", "Timing", " · ".join(parts), style="bright_blue")
+    if path is not None:
+        print_step("◆", "Metrics", str(path), style="bright_blue")
+
+
+def print_metrics_summary(summary: dict):
+    """Per-stage table for ``aggregate_metrics`` output."""
+    table = Table(box=box.ROUNDED, border_style="bright_black")
+    table.add_column("Stage", style="bold white")
+    table.add_column("Count", justify="right")
+    table.add_column("Wall", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p95", justify="right")
+    table.add_column("CPU", justify="right")
+    for stage, totals in summary["stages"].items():
+        table.add_row(
+            stage,
+            str(totals["count"]),
+            f"{totals['wall']:.1f}s",
+            f"{totals['p50']:.2f}s",
+            f"{totals['p95']:.2f}s",
+            f"{totals['cpu']:.1f}s",
+        )
+    console.print()
+    console.print(table)
+    tokens = summary["tokens"]
+    print_step(
+        "◆",
+        "Runs",
+        f"{summary['succeeded']}/{summary['runs']} succeeded · "
+        f"p50 {summary['wall']['p50']:.1f}s · p95 {summary['wall']['p95']:.1f}s",
+        style="bright_blue",
+    )
+    print_step(
+        "◆",
+        "Tokens",
+        f"{tokens['prompt']:,} prompt · {tokens['completion']:,} completion · "
+        f"{summary['llm']['calls']} LLM calls ({summary['llm']['cached']} cached)",
+        style="bright_blue",
+    )
+
+
+def print_cache_stats():
+    if llm_cache.enabled:
+        stats = llm_cache.stats()
+        print_step(
+            "◆",
+            "LLM cache",
+            f"{stats['hits']} hits · {stats['misses']} misses · "
+            f"{stats['entries']} entries ({stats['bytes'] / 1024:.0f} KiB)",
+            style="bright_blue",
+        )
+    if render_cache.enabled:
+        print_step(
+            "◆",
+            "Render cache",
+            f"{render_cache.hits} hits · {render_cache.misses} misses",
+            style="bright_blue",
+        )
+    if fix_memory.enabled and (fix_memory.hits or fix_memory.learned):
+        stats = fix_memory.stats()
+        print_step(
+            "◆",
+            "Fix memory",
+            f"{stats['hits']} repairs · {stats['learned']} learned · "
+            f"{stats['rules']} rules for {stats['signatures']} errors",
+            style="bright_blue",
+        )
+    if scene_library.enabled and (scene_library.served or scene_library.added):
+        stats = scene_library.stats()
+        print_step(
+            "◆",
+            "Scene library",
+            f"{stats['served']} reused · {stats['examples']} examples sent · "
+            f"{stats['scenes']} scenes",
+            style="bright_blue",
+        )
+    if partial_movies.enabled and (partial_movies.reused or partial_movies.rendered):
+        print_step(
+            "◆",
+            "Partial movies",
+            f"{partial_movies.reused} reused · {partial_movies.rendered} rendered · "
+            f"{partial_movies.size() / 1024 / 1024:.0f} MiB pooled",
+            style="bright_blue",
+        )
+    routed = {model for tier in parse_model_tiers(MODELS) for model in tier}
+    if model_stats.enabled and len(routed) > 1:
+        for model, stats in model_stats.stats().items():
+            if model not in routed:
+                continue
+            print_step(
+                "◆",
+                model,
+                f"{stats['passed']}/{stats['scripts']} scripts passed · "
+                f"p50 {stats['p50']:.1f}s · p95 {stats['p95']:.1f}s · "
+                f"{stats['hedge_wins']} hedge wins",
+                style="bright_blue",
+            )
+
+
+def run_cli(args: argparse.Namespace):
+    """Run the command line parsed by ``app.parse_args``."""
+    global RENDER_BACKEND, DRY_RUN_VALIDATION, RENDER_TIMEOUT, RENDER_CPU_LIMIT
+    global RENDER_MEMORY_LIMIT, MAX_SCENE_SECONDS, MAX_SCENE_FRAMES, HEAL_MODE
+    global METRICS_DIR, LLM_CONCURRENCY, LLM_TIMEOUT, MODELS, ESCALATE_AFTER, HEDGE
+    global SEGMENTS, SCENE_EXAMPLES
+
+    MODELS = args.models
+    ESCALATE_AFTER = args.escalate_after
+    HEDGE = HEDGE or args.hedge
+    LLM_CONCURRENCY = max(1, args.llm_concurrency)
+    LLM_TIMEOUT = args.llm_timeout
+    RENDER_TIMEOUT = args.render_timeout
+    RENDER_CPU_LIMIT = args.cpu_limit
+    RENDER_MEMORY_LIMIT = args.memory_limit
+    MAX_SCENE_SECONDS = args.max_scene_seconds
+    MAX_SCENE_FRAMES = args.max_frames
+    HEAL_MODE = args.heal_mode
+    SEGMENTS = args.segments
+    SCENE_EXAMPLES = max(0, args.examples)
+    METRICS_DIR = args.metrics
+
+    if args.metrics_summary:
+        runs = load_metrics(METRICS_DIR)
+        if not runs:
+            print_error(f"No run metrics found in {METRICS_DIR}")
+            sys.exit(1)
+        print_metrics_summary(aggregate_metrics(runs))
+        console.print()
+        sys.exit(0)
+
+    final_qualities = [
+        f"-q{q.strip()}" for q in args.final_quality.split(",") if q.strip()
+    ]
+    unknown = [q for q in final_qualities if q not in QUALITY_DIRS]
+    if unknown:
+        print_error(
+            f"Unknown --final-quality value(s): {', '.join(q[2:] for q in unknown)}"
+        )
+        sys.exit(2)
+    try:
+        presets = parse_artifacts(args.artifacts)
+    except ValueError as e:
+        print_error(f"Invalid --artifacts value: {e}")
+        sys.exit(2)
+    artifacts = ArtifactPipeline(presets) if presets else None
+    ladder = (
+        QualityLadder(final_qualities, artifacts=artifacts) if final_qualities else None
+    )
+    if args.worker:
+        RENDER_BACKEND = "worker"
+    if args.no_dry_run:
+        DRY_RUN_VALIDATION = False
+    print_banner()
+    if RENDER_BACKEND == "worker" and SEGMENTS > 1:
+        print_step(
+            "↻",
+            "Segmented renders",
+            "--segments bypasses the render worker for full renders",
+            style="bright_yellow",
+        )
+
+    if args.batch:
+        ok = run_batch(
+            args.batch,
+            args.out,
+            args.llm_workers,
+            args.render_workers,
+            args.candidates,
+            ladder,
+            artifacts,
+        )
+        console.print()
+        sys.exit(0 if ok else 1)
+
+    # Get prompt
+    if args.prompt:
+        prompt = " ".join(args.prompt)
+        print_step("◆", "Prompt", prompt, style="bright_cyan")
+    else:
+        from rich.prompt import Prompt
+
+        console.print(
+            Text.assemble(
+                Text(" ◆ ", style="bold bright_cyan"),
+                Text("What animation would you like to create?", style="bold white"),
+            )
+        )
+        console.print()
+        prompt = Prompt.ask(
+            "   [dim]Describe your animation[/dim]",
+            console=console,
+        ).strip()
+
+    console.print()
+
+    if not prompt:
+        print_error("No prompt provided.")
+        sys.exit(1)
+
+    run = RunMetrics()
+    _current_run.set(run)
+    try:
+        # Generate code (and clean up LLM output)
+        try:
+            codes = generate_candidates(prompt, args.candidates)
+        except Exception as e:
+            print_error(str(e))
+            sys.exit(1)
+
+        if not codes:
+            print_error("The model returned empty output. Try a different prompt.")
+            sys.exit(1)
+
+        # Run self-healing loop: render → fix → re-render → …
+        output_file = Path("generated_scene.py")
+        if args.candidates > 1:
+            success = speculative_healing_loop(
+                codes, prompt, output_file, args.candidates
+            )
+        else:
+            success = self_healing_loop(codes[0][0], prompt, output_file)
+        run.success = success
+
+        if success and ladder is not None:
+            console.print()
+            print_step(
+                "◆",
+                "Queued final renders",
+                ", ".join(QUALITY_DIRS[q] for q in ladder.qualities),
+                style="bright_cyan",
+            )
+            ladder.submit(output_file)
+            ladder.wait()
+        elif success and artifacts is not None:
+            console.print()
+            print_step(
+                "◆",
+                "Queued artifacts",
+                ", ".join(artifacts.presets),
+                style="bright_cyan",
+            )
+            artifacts.submit(output_file, video_path(output_file))
+        if artifacts is not None:
+            artifacts.wait()
+    finally:
+        run.finish()
+        metrics_path = run.write(METRICS_DIR)
+
+    console.print()
+    print_run_metrics(run, metrics_path)
+    print_cache_stats()
+
+    console.print()
+    if not success:
+        sys.exit(1)
@@ -0,0 +1,244 @@
+"""
+OpenAI-compatible stand-in for the chat completions endpoint.
+
+Replays the completions recorded in ``fixtures/scenarios.json`` — a first
+script per prompt, then the scripts that successive heal requests return —
+with a configurable time-to-first-token and streaming rate, so AutoManim can
+be benchmarked without a live model. Point the app at it with
+``OPENROUTER_BASE_URL=http://127.0.0.1:<port>/v1``.
+"""
+
+import argparse
+import difflib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Characters per streamed chunk; roughly four tokens.
+CHUNK_CHARS = 16
+
+
+def load_scenarios(fixtures_dir: Path = FIXTURES_DIR) -> list[dict]:
+    """Read the scenario list and the fixture scenes each one replays."""
+    scenarios = json.loads((fixtures_dir / "scenarios.json").read_text("utf-8"))
+    for scenario in scenarios:
+        scenario["scripts"] = [
+            (fixtures_dir / "scenes" / name).read_text("utf-8").strip()
+            for name in scenario["completions"]
+        ]
+    return scenarios
+
+
+def patch_blocks(old: str, new: str, context: int = 2) -> str:
+    """SEARCH/REPLACE blocks that turn ``old`` into ``new``."""
+    a, b = old.splitlines(), new.splitlines()
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    blocks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        lo, hi = max(0, i1 - context), min(len(a), i2 + context)
+        blocks.append(
+            "<<<<<<< SEARCH\n"
+            + "\n".join(a[lo:hi])
+            + "\n=======\n"
+            + "\n".join(a[lo:i1] + b[j1:j2] + a[i2:hi])
+            + "\n>>>>>>> REPLACE"
+        )
+    return "\n\n".join(blocks)
+
+
+def _failing_code(prompt: str) -> str:
+    """The script quoted in a heal prompt."""
+    start = prompt.find("```python\n")
+    if start == -1:
+        return ""
+    start += len("```python\n")
+    return prompt[start : prompt.find("\n```", start)].strip()
+
+
+class ReplayBackend:
+    """Chooses the recorded completion for each request.
+
+    A request whose user message quotes failing code is a heal: the fixture
+    script closest to that code is located and the next one in the scenario
+    is returned (the last one repeats). Patch-mode heals get the difference
+    as SEARCH/REPLACE blocks. Anything else is a first generation.
+    """
+
+    def __init__(
+        self, scenarios: list[dict], latency: float = 0.0, tokens_per_second: float = 0
+    ):
+        self.scenarios = scenarios
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def reply(self, messages: list[dict]) -> str | None:
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next(
+            (m["content"] for m in reversed(messages) if m["role"] == "user"), ""
+        )
+        scenario = next((s for s in self.scenarios if s["prompt"] in user), None)
+        if scenario is None:
+            return None
+        scripts = scenario["scripts"]
+
+        failing = _failing_code(user)
+        if not failing:
+            return scripts[0]
+        closest = max(
+            range(len(scripts)),
+            key=lambda i: difflib.SequenceMatcher(None, scripts[i], failing).ratio(),
+        )
+        fixed = scripts[min(closest + 1, len(scripts) - 1)]
+        if "SEARCH/REPLACE" in system:
+            return patch_blocks(failing, fixed)
+        return fixed
+
+    def chunk_delay(self) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return CHUNK_CHARS / 4 / self.tokens_per_second
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    server_version = "AutoManimMock/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        backend: ReplayBackend = self.server.backend
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages", [])
+
+        content = backend.reply(messages)
+        if content is None:
+            self._send_json(
+                404, {"error": {"message": "no scenario matches this prompt"}}
+            )
+            return
+
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        }
+        with backend._lock:
+            backend.requests += 1
+            backend.completion_tokens += usage["completion_tokens"]
+
+        time.sleep(backend.latency)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {
+            "id": completion_id,
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+        }
+        if not request.get("stream"):
+            self._send_json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(choices: list, **extra):
+            payload = {**base, "object": "chat.completion.chunk", "choices": choices}
+            self.wfile.write(f"data: {json.dumps({**payload, **extra})}\n\n".encode())
+            self.wfile.flush()
+
+        delay = backend.chunk_delay()
+        try:
+            for start in range(0, len(content), CHUNK_CHARS):
+                piece = content[start : start + CHUNK_CHARS]
+                event(
+                    [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                )
+                if delay:
+                    time.sleep(delay)
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream (early abort).
+            pass
+
+
+def start_server(
+    backend: ReplayBackend, host: str = "127.0.0.1", port: int = 0
+) -> ThreadingHTTPServer:
+    """Serve ``backend`` from a daemon thread; ``port=0`` picks a free port."""
+    server = ThreadingHTTPServer((host, port), CompletionHandler)
+    server.daemon_threads = True
+    server.backend = backend
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.3, help="seconds before the first token"
+    )
+    parser.add_argument(
+        "--tps", type=float, default=150, help="streamed tokens per second, 0 = instant"
+    )
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    backend = ReplayBackend(load_scenarios(args.fixtures), args.latency, args.tps)
+    server = start_server(backend, args.host, args.port)
+    print(
+        f"Serving {len(backend.scenarios)} scenarios on "
+        f"http://{args.host}:{server.server_port}/v1"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Offline end-to-end benchmark for AutoManim.
+
+Starts the mock completions server, then drives ``generate_code`` and
+``self_healing_loop`` through every fixture scenario with real manim renders.
+Reports latency percentiles, renders per minute, the distribution of heal
+attempts, per-stage timings and peak RSS. LLM, render and fix-memory caches
+are disabled (and isolated in a temporary directory) unless ``--warm`` is
+given.
+
+    python -m bench.run --repeat 3 --latency 0.3 --tps 150 --json report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from bench.mock_server import FIXTURES_DIR, ReplayBackend, load_scenarios, start_server
+
+
+def peak_rss_mib() -> dict:
+    """Peak resident set size of this process and of its largest child."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return {}
+    # ru_maxrss is KiB on Linux but bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "harness": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "renders": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1
+        ),
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay fixture scenarios through the full heal loop."
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        metavar="ID",
+        help="only run these scenario ids (repeatable)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.3,
+        help="mock time to first token in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--tps",
+        type=float,
+        default=150,
+        help="mock streaming rate in tokens/s, 0 = instant (default: %(default)s)",
+    )
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    parser.add_argument(
+        "--backend",
+        choices=("subprocess", "worker"),
+        default="subprocess",
+        help="render backend to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--warm", action="store_true", help="keep the caches enabled across runs"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the app's console output"
+    )
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    scenarios = load_scenarios(args.fixtures)
+    if args.scenario:
+        scenarios = [s for s in scenarios if s["id"] in args.scenario]
+    backend = ReplayBackend(scenarios, args.latency, args.tps)
+    server = start_server(backend)
+    root = Path(tempfile.mkdtemp(prefix="automanim-bench-"))
+
+    # The app reads these at import time.
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    os.environ["AUTOMANIM_CACHE_DIR"] = str(root / "cache")
+    os.environ["AUTOMANIM_METRICS_DIR"] = str(root / "metrics")
+    if not args.warm:
+        os.environ["AUTOMANIM_NO_CACHE"] = "1"
+    import automanim
+
+    automanim.RENDER_BACKEND = args.backend
+    automanim.console.quiet = not args.verbose
+
+    runs = []
+    started = time.perf_counter()
+    for repeat in range(args.repeat):
+        for scenario in scenarios:
+            workdir = root / f"{scenario['id']}-{repeat}"
+            workdir.mkdir()
+            run = automanim.RunMetrics(scenario=scenario["id"], repeat=repeat)
+            token = automanim._current_run.set(run)
+            error = None
+            try:
+                code = automanim.clean_code(automanim.generate_code(scenario["prompt"]))
+                success = automanim.self_healing_loop(
+                    code, scenario["prompt"], workdir / "generated_scene.py"
+                )
+            except Exception as e:
+                success, error = False, str(e)
+            finally:
+                automanim._current_run.reset(token)
+            run.finish(success)
+            record = run.to_dict()
+            record["error"] = error
+            runs.append(record)
+            print(
+                f"{scenario['id']:<28} {'ok ' if success else 'FAIL'} "
+                f"{record['wall']:7.2f}s",
+                flush=True,
+            )
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    walls = [run["wall"] for run in runs]
+    full_renders = sum(
+        1
+        for run in runs
+        for sample in run["stages"]
+        if sample["stage"] == "render" and not sample.get("dry_run")
+    )
+    heals = Counter(
+        sum(
+            sample["stage"] == "heal"
+            or (sample["stage"] == "fix_memory" and sample.get("hit"))
+            for sample in run["stages"]
+        )
+        for run in runs
+    )
+    summary = automanim.aggregate_metrics(runs)
+    return {
+        "runs": len(runs),
+        "succeeded": summary["succeeded"],
+        "elapsed": round(elapsed, 2),
+        "latency": {
+            "p50": automanim._percentile(walls, 0.5),
+            "p95": automanim._percentile(walls, 0.95),
+            "mean": round(sum(walls) / len(walls), 3) if walls else 0.0,
+        },
+        "renders": {
+            "full": full_renders,
+            "per_minute": round(full_renders / (elapsed / 60), 2) if elapsed else 0.0,
+        },
+        "heal_attempts": {str(k): heals[k] for k in sorted(heals)},
+        "llm": {
+            "requests": backend.requests,
+            "completion_tokens": backend.completion_tokens,
+        },
+        "peak_rss_mib": peak_rss_mib(),
+        "stages": summary["stages"],
+        "settings": {
+            "latency": args.latency,
+            "tps": args.tps,
+            "backend": args.backend,
+            "warm": args.warm,
+            "repeat": args.repeat,
+        },
+        "runs_detail": runs,
+    }
+
+
+def main():
+    args = parse_args()
+    report = run_benchmark(args)
+
+    print()
+    print(
+        f"runs {report['succeeded']}/{report['runs']} ok · "
+        f"p50 {report['latency']['p50']:.2f}s · p95 {report['latency']['p95']:.2f}s · "
+        f"{report['renders']['per_minute']:.1f} renders/min"
+    )
+    print(
+        "heal attempts: "
+        + ", ".join(f"{k}×{v}" for k, v in report["heal_attempts"].items())
+    )
+    print(
+        "peak RSS: "
+        + ", ".join(f"{k} {v:.0f} MiB" for k, v in report["peak_rss_mib"].items())
+    )
+    for stage, totals in report["stages"].items():
+        print(
+            f"  {stage:<12} ×{totals['count']:<4} {totals['wall']:8.2f}s  "
+            f"p50 {totals['p50']:.2f}s  p95 {totals['p95']:.2f}s  "
+            f"cpu {totals['cpu']:.2f}s"
+        )
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Startup benchmark for AutoManim.
+
+Runs the CLI entry points that do no real work (``import app``, ``--help``)
+and the engine import every real run pays for in fresh interpreters under
+``python -X importtime``. Reports the median wall time, the time spent
+importing, the slowest top-level imports and which of the dependencies that
+should load lazily were imported anyway.
+
+    python -m bench.startup --repeat 10 --top 15 --json startup.json
+
+``--check`` exits non-zero if a lazy dependency was imported or a command
+took longer than its budget: its median minus the bare interpreter's, in
+milliseconds (``BUDGETS``, or ``--budget`` for every command).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BASELINE = "python"
+COMMANDS = {
+    BASELINE: ["-c", "pass"],
+    "import app": ["-c", "import app"],
+    "app --help": ["app.py", "--help"],
+    "import automanim": ["-c", "import automanim"],
+}
+
+# Milliseconds each command may add to the bare interpreter's start.
+BUDGETS = {
+    "import app": 30,
+    "app --help": 60,
+    "import automanim": 200,
+}
+
+# Only the paths that talk to the LLM, render, or draw live output need these.
+LAZY_MODULES = (
+    "openai",
+    "httpx",
+    "asyncio",
+    "multiprocessing",
+    "concurrent.futures",
+    "importlib.metadata",
+    "pygments",
+    "numpy",
+    "rich.syntax",
+    "rich.live",
+    "rich.prompt",
+    "manim",
+)
+# The entry point parses arguments before it loads the engine or rich.
+ENTRY_LAZY_MODULES = LAZY_MODULES + ("automanim", "rich")
+ENTRY_COMMANDS = ("import app", "app --help")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, depth) for every ``-X importtime`` line."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+def measure(args: list[str]) -> dict:
+    """One fresh interpreter: wall time and the modules it imported.
+
+    Bytecode is written and reused as in a normal install, even when
+    ``PYTHONDONTWRITEBYTECODE`` is set here.
+    """
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    imports = parse_importtime(proc.stderr)
+    return {
+        "wall": wall,
+        "returncode": proc.returncode,
+        "imports": imports,
+        "import_time": sum(self_us for _, self_us, _, _ in imports) / 1e6,
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    report = {}
+    for label, command in COMMANDS.items():
+        measure(command)  # compiles the bytecode the timed runs load
+        runs = [measure(command) for _ in range(args.repeat)]
+        last = runs[-1]
+        lazy = ENTRY_LAZY_MODULES if label in ENTRY_COMMANDS else LAZY_MODULES
+        modules = {name for name, _, _, _ in last["imports"]}
+        top = sorted(
+            (entry for entry in last["imports"] if entry[3] == 0),
+            key=lambda entry: entry[2],
+            reverse=True,
+        )[: args.top]
+        report[label] = {
+            "returncode": last["returncode"],
+            "wall_ms": round(statistics.median(r["wall"] for r in runs) * 1000, 1),
+            "import_ms": round(
+                statistics.median(r["import_time"] for r in runs) * 1000, 1
+            ),
+            "modules": len(modules),
+            "lazy_loaded": [
+                name
+                for name in lazy
+                if name in modules or any(m.startswith(name + ".") for m in modules)
+            ],
+            "top": [
+                {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                for name, _, cumulative, _ in top
+            ],
+        }
+    for result in report.values():
+        result["overhead_ms"] = round(
+            result["wall_ms"] - report[BASELINE]["wall_ms"], 1
+        )
+    return report
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure how long the CLI takes to start."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="interpreters started per command (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="slowest top-level imports to list (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        metavar="MS",
+        help="with --check, the milliseconds every command may add to the bare "
+        "interpreter's start (default: per command, see BUDGETS)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail if a lazy dependency is imported or the budget is exceeded",
+    )
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = run_benchmark(args)
+
+    failures = []
+    for label, result in report.items():
+        print(
+            f"{label:<16} {result['wall_ms']:7.1f} ms wall · "
+            f"{result['overhead_ms']:+7.1f} ms over {BASELINE} · "
+            f"{result['import_ms']:7.1f} ms importing · {result['modules']} modules"
+        )
+        for entry in result["top"]:
+            print(f"    {entry['cumulative_ms']:7.1f} ms  {entry['module']}")
+        if result["returncode"]:
+            failures.append(f"{label} exited with {result['returncode']}")
+        if result["lazy_loaded"]:
+            print(f"    loaded eagerly: {', '.join(result['lazy_loaded'])}")
+            failures.append(f"{label} imported {', '.join(result['lazy_loaded'])}")
+        budget = BUDGETS.get(label) if args.budget is None else args.budget
+        if label != BASELINE and budget is not None and result["overhead_ms"] > budget:
+            failures.append(
+                f"{label} took {result['overhead_ms']} ms over {BASELINE} "
+                f"(budget {budget} ms)"
+            )
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"report written to {args.json}")
+    if args.check and failures:
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+AutoManim settings: the defaults the CLI, the server and the engine share.
+
+Kept apart from ``automanim`` so that ``app.py`` can build its argument
+parser (and answer ``--help``) without importing the engine. ``automanim``
+imports every setting as a module global of its own; command-line flags and
+the server override those copies, never the values here.
+"""
+
+import os
+from pathlib import Path
+
+
+def _load_dotenv():
+    """Load the nearest ``.env`` above this file, as ``dotenv.load_dotenv()``
+    would, importing python-dotenv only when there is one."""
+    for folder in Path(__file__).absolute().parents:
+        if (folder / ".env").is_file():
+            from dotenv import load_dotenv
+
+            load_dotenv(folder / ".env")
+            return
+
+
+_load_dotenv()
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+MODEL = "arcee-ai/trinity-large-preview:free"
+
+# Model tiers, cheapest first: "fast-a|fast-b,strong" is two tiers. Models in
+# one tier are interchangeable and are ranked by their recorded latency and
+# success rate. Generation uses the first tier; healing moves up a tier after
+# every ESCALATE_AFTER failed heals.
+MODELS = os.getenv("AUTOMANIM_MODELS", MODEL)
+ESCALATE_AFTER = 2
+# A tier whose models keep failing (ROUTING_MIN_SUCCESS over at least
+# ROUTING_MIN_TRIALS scripts) is skipped in favour of the next one.
+ROUTING_MIN_TRIALS = 5
+ROUTING_MIN_SUCCESS = 0.3
+# Hedged requests: if the first model hasn't answered within its p95 latency
+# (HEDGE_DELAY until that is known), the same request goes to the runner-up
+# model and the first valid answer wins.
+HEDGE = False
+HEDGE_DELAY = 20.0
+
+MAX_HEAL_ATTEMPTS = 3
+
+# All LLM requests share one AsyncOpenAI client (one keep-alive connection
+# pool) on a background event loop.
+LLM_CONCURRENCY = 8  # requests in flight at once
+LLM_TIMEOUT = 180.0  # seconds for one whole streamed completion
+LLM_CONNECT_TIMEOUT = 10.0
+LLM_MAX_RETRIES = 5  # on 429, 5xx, timeouts and dropped connections
+LLM_BACKOFF_BASE = 1.0  # seconds; doubles per retry, with full jitter
+LLM_BACKOFF_MAX = 30.0
+
+# "patch" asks for SEARCH/REPLACE edits instead of a whole new script once the
+# script is at least PATCH_MIN_LINES long; "rewrite" always asks for a rewrite.
+HEAL_MODE = "patch"
+PATCH_MIN_LINES = 30
+
+CACHE_DIR = Path(os.getenv("AUTOMANIM_CACHE_DIR", ".automanim_cache"))
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LLM_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds since last use
+RENDER_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Manim's per-animation partial movies, pooled per job directory and quality
+# so later heal attempts, segments and re-renders reuse unchanged animations.
+PARTIAL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Fix memory: repairs that stop working are evicted once they have been tried
+# FIX_MEMORY_MIN_TRIALS times with a success rate below FIX_MEMORY_MIN_SUCCESS.
+FIX_MEMORY_MAX_SIGNATURES = 500
+FIX_MEMORY_MIN_TRIALS = 3
+FIX_MEMORY_MIN_SUCCESS = 0.5
+# Scene library: prompts that rendered, with their final script. Up to
+# SCENE_EXAMPLES stored scenes at least SCENE_EXAMPLE_MIN_SIMILARITY alike
+# (cosine of IDF-weighted hashed n-gram vectors) go along as few-shot
+# examples; a stored scene for the same prompt (ignoring case and
+# punctuation) is reused as is.
+SCENE_LIBRARY_MAX_SCENES = 1000
+SCENE_VECTOR_DIM = 2048
+SCENE_EXAMPLES = 2
+SCENE_EXAMPLE_MIN_SIMILARITY = 0.3
+SCENE_EXAMPLE_MAX_CHARS = 6000
+
+# Streaming generations are cancelled if no GenScene header shows up this early.
+STREAM_HEADER_LINES = 120
+STREAM_PREVIEW_LINES = 14
+
+# Speculative mode: candidate scripts generated and rendered concurrently.
+SPECULATIVE_CANDIDATES = 1
+SPECULATIVE_TEMPERATURE = 0.9
+
+BATCH_OUTPUT_DIR = Path("batch_runs")
+BATCH_LLM_WORKERS = 4
+
+RENDER_QUALITY = "-ql"
+# "subprocess" starts a fresh `python -m manim` per render; "worker" keeps
+# long-lived worker processes that import manim once.
+RENDER_BACKEND = os.getenv("AUTOMANIM_RENDER_BACKEND", "subprocess")
+RENDER_WORKERS = os.cpu_count() or 1
+# Per-render limits; a breach kills the render and is reported to the LLM.
+RENDER_TIMEOUT = 600  # wall-clock seconds
+RENDER_CPU_LIMIT = 900  # CPU seconds (RLIMIT_CPU)
+RENDER_MEMORY_LIMIT = 8192  # MiB of address space (RLIMIT_AS), 0 = no cap
+MAX_SCENE_SECONDS = 120  # total animation length
+MAX_SCENE_FRAMES = 0  # total frames at the render's frame rate, 0 = no cap
+RENDER_TIMEOUT_EXIT = 124
+# Run construct() once with animations skipped before paying for a full render.
+DRY_RUN_VALIDATION = True
+
+# Per-run stage timings and token usage, written as JSON and OpenMetrics.
+METRICS_DIR = Path(os.getenv("AUTOMANIM_METRICS_DIR", str(CACHE_DIR / "metrics")))
+# Prefix of the line a manim render process prints its own timings on.
+RENDER_PROBE_MARK = "__automanim_probe__ "
+
+# Quality ladder: scripts that pass at RENDER_QUALITY are re-rendered at these
+# qualities in a background process pool.
+FINAL_QUALITIES: list[str] = []
+FINAL_RENDER_TIMEOUT = 3600  # wall-clock seconds for one high-quality render
+# Full renders of scenes with at least 2 * SEGMENT_MIN_PLAYS play()/wait()
+# calls are split into up to SEGMENTS ranges rendered by parallel manim
+# processes and joined without re-encoding; 0 or 1 renders serially.
+SEGMENTS = 0
+SEGMENT_MIN_PLAYS = 4
+# Artifact pipeline: the best render of a passing script is post-processed in
+# a background process pool into the ARTIFACTS presets. Outputs over their
+# preset's max_bytes are re-encoded smaller up to ARTIFACT_BUDGET_RETRIES
+# times. "quality" is the JPEG q:v or the video CRF (lower is better).
+ARTIFACTS: list[str] = []
+ARTIFACT_DIR = Path(os.getenv("AUTOMANIM_ARTIFACT_DIR", str(CACHE_DIR / "artifacts")))
+ARTIFACT_PRESETS = {
+    "poster": {"format": "jpg", "width": 1920, "quality": 2, "max_bytes": 1 << 19},
+    "thumb": {"format": "jpg", "width": 320, "quality": 4, "max_bytes": 48 << 10},
+    "web": {"format": "mp4", "width": 1280, "quality": 23, "max_bytes": 16 << 20},
+    "webm": {"format": "webm", "width": 1280, "quality": 33, "max_bytes": 16 << 20},
+    "gif": {"format": "gif", "width": 480, "fps": 12, "max_bytes": 8 << 20},
+}
+ARTIFACT_BUDGET_RETRIES = 3
+ARTIFACT_TIMEOUT = 900  # wall-clock seconds for one encode
+
+# Error output handed to fix_code is distilled to roughly this many tokens.
+ERROR_TOKEN_BUDGET = 600
+ERROR_CONTEXT_LINES = 2  # source lines shown around each failing line
+
+# Resolution folder manim writes each quality flag's output into.
+QUALITY_DIRS = {
+    "-ql": "480p15",
+    "-qm": "720p30",
+    "-qh": "1080p60",
+    "-qp": "1440p60",
+    "-qk": "2160p60",
+}
+# manim.constants.QUALITIES entry behind each quality flag.
+QUALITY_NAMES = {
+    "-ql": "low_quality",
+    "-qm": "medium_quality",
+    "-qh": "high_quality",
+    "-qp": "production_quality",
+    "-qk": "fourk_quality",
+}
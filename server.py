@@ -0,0 +1,573 @@
+"""
+Headless AutoManim service.
+
+Prompts are submitted over a small JSON API, queued in SQLite by priority and
+picked up by long-lived worker processes. Each worker imports manim once (in
+its render worker) and keeps its LLM client warm, so those costs are paid at
+startup rather than per animation. Progress events from ``self_healing_loop``
+are stored with each job instead of being drawn on a terminal.
+
+    python server.py --port 8000 --workers 2
+
+    POST   /jobs                          {"prompt": "...", "priority": 0}
+    GET    /jobs?status=queued&limit=50
+    GET    /jobs/<id>
+    GET    /jobs/<id>/events?after=<seq>
+    DELETE /jobs/<id>                     cancel a queued job
+    GET    /jobs/<id>/artifacts
+    GET    /jobs/<id>/artifacts/<path>    download one file
+    GET    /health
+"""
+
+import argparse
+import json
+import mimetypes
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import automanim
+import config
+
+DEFAULT_DB = automanim.CACHE_DIR / "jobs.sqlite3"
+DEFAULT_OUT = Path("server_jobs")
+
+POLL_INTERVAL = 0.5  # seconds between queue polls of an idle worker
+MAX_PROMPT_CHARS = 4000
+MAX_CANDIDATES = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    candidates INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL,
+    worker TEXT,
+    attempt INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobQueue:
+    """Priority job queue in one SQLite file, shared by the server and workers.
+
+    Every call opens its own connection, so the queue can be used from any
+    thread or process. ``claim`` hands the highest-priority, oldest queued
+    job to exactly one worker.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @staticmethod
+    def _job(row: sqlite3.Row | None) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, prompt: str, priority: int = 0, candidates: int = 1) -> dict:
+        job_id = uuid.uuid4().hex[:12]
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO jobs (id, prompt, priority, candidates, status, created)"
+                " VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, prompt, priority, candidates, time.time()),
+            )
+        return self.get(job_id)
+
+    def claim(self, worker: str) -> dict | None:
+        """Mark the next queued job as running on ``worker`` and return it."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued'"
+                " ORDER BY priority DESC, created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = ?"
+                " WHERE id = ?",
+                (worker, time.time(), row["id"]),
+            )
+            db.execute("COMMIT")
+        return self.get(row["id"])
+
+    def finish(self, job_id: str, status: str, result: dict):
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result), job_id),
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel ``job_id`` if it hasn't started; True if it was cancelled."""
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def requeue(self, worker: str | None = None) -> int:
+        """Put running jobs (of ``worker``, or all) back in the queue."""
+        query = "UPDATE jobs SET status = 'queued', worker = NULL, attempt = 0"
+        query += ", stage = NULL WHERE status = 'running'"
+        params: tuple = ()
+        if worker is not None:
+            query += " AND worker = ?"
+            params = (worker,)
+        with closing(self._connect()) as db:
+            return db.execute(query, params).rowcount
+
+    def add_event(self, job_id: str, kind: str, data: dict):
+        """Append a progress event and keep the job's progress columns current."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO events (job_id, seq, time, kind, data) VALUES"
+                " (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE job_id = ?),"
+                " ?, ?, ?)",
+                (job_id, job_id, time.time(), kind, json.dumps(data)),
+            )
+            if kind == "heal_attempt":
+                db.execute(
+                    "UPDATE jobs SET attempt = ? WHERE id = ?",
+                    (data["attempt"], job_id),
+                )
+            if kind in ("step", "render_start", "heal_attempt"):
+                stage = data.get("label") or kind.replace("_", " ")
+                db.execute("UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+            db.execute("COMMIT")
+
+    def get(self, job_id: str) -> dict | None:
+        with closing(self._connect()) as db:
+            return self._job(
+                db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            )
+
+    def jobs(self, status: str | None = None, limit: int = 50) -> list[dict]:
+        query, params = "SELECT * FROM jobs", []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as db:
+            return [self._job(row) for row in db.execute(query, params)]
+
+    def events(self, job_id: str, after: int = 0) -> list[dict]:
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT seq, time, kind, data FROM events"
+                " WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            )
+            return [{**dict(row), "data": json.loads(row["data"])} for row in rows]
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: count for status, count in rows}
+
+
+# ── Workers ──────────────────────────────────────────────────────────────────
+
+
+class JobReporter(automanim.Reporter):
+    """Stores a job's progress events in the queue instead of drawing them."""
+
+    # Terminal layout and bulky payloads aren't worth storing.
+    SKIP = {"blank", "render_output"}
+    DROP = {"icon", "style", "code"}
+
+    def __init__(self, queue: JobQueue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+
+    def emit(self, kind: str, **data):
+        if kind in self.SKIP:
+            return
+        data = {k: v for k, v in data.items() if k not in self.DROP}
+        try:
+            self.queue.add_event(self.job_id, kind, data)
+        except sqlite3.Error:
+            pass  # progress is best effort; the job result is what counts
+
+
+def run_job(
+    queue: JobQueue,
+    job: dict,
+    out_dir: Path,
+    artifacts: automanim.ArtifactPipeline | None = None,
+) -> dict:
+    """Run one claimed job through ``automanim.run_batch_job`` and record the result.
+
+    The job is finished as soon as its video renders; ``artifacts`` encodes
+    in the background and lists its files in the job's ``artifacts.json``.
+    """
+    run = automanim.RunMetrics(job=job["id"], server=out_dir.name)
+    token = automanim._reporter.set(JobReporter(queue, job["id"]))
+    try:
+        record = automanim.run_batch_job(
+            {"id": job["id"], "prompt": job["prompt"]},
+            out_dir,
+            None,
+            job["candidates"],
+            run=run,
+            artifacts=artifacts,
+        )
+    except Exception as e:  # run_batch_job records script errors itself
+        record = {"id": job["id"], "status": "error", "error": str(e)}
+    finally:
+        automanim._reporter.reset(token)
+    try:
+        run.write(automanim.METRICS_DIR)
+    except OSError:
+        pass
+    queue.finish(job["id"], record["status"], record)
+    return record
+
+
+def worker_main(db_path: str, out_dir: str, name: str, artifacts: str = ""):
+    """Worker process: warm up once, then run queued jobs until terminated."""
+    # SIGTERM exits normally so the render workers are closed on the way out.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    automanim.console.quiet = True
+    automanim.RENDER_BACKEND = "worker"
+    automanim.get_render_workers(1).start()  # imports manim in the render worker
+    automanim.warm_llm_client()
+    pipeline = None
+    if artifacts:
+        pipeline = automanim.ArtifactPipeline(
+            automanim.parse_artifacts(artifacts), workers=1
+        )
+
+    queue = JobQueue(Path(db_path))
+    while True:
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(queue, job, Path(out_dir), pipeline)
+
+
+class WorkerSupervisor:
+    """Starts the worker processes and replaces any that die.
+
+    A job whose worker died is put back in the queue.
+    """
+
+    def __init__(self, queue: JobQueue, out_dir: Path, count: int, artifacts: str = ""):
+        self.queue = queue
+        self.out_dir = out_dir
+        self.count = count
+        self.artifacts = artifacts
+        self.processes: dict[str, multiprocessing.Process] = {}
+        self._stop = threading.Event()
+        self._ctx = multiprocessing.get_context("spawn")
+
+    def _spawn(self, name: str):
+        # Not a daemon: workers start render worker processes of their own.
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(str(self.queue.path), str(self.out_dir), name, self.artifacts),
+            name=f"automanim-{name}",
+        )
+        process.start()
+        self.processes[name] = process
+
+    def start(self):
+        for i in range(self.count):
+            self._spawn(f"worker-{i}")
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(2.0):
+            for name, process in list(self.processes.items()):
+                if not process.is_alive():
+                    self.queue.requeue(name)
+                    self._spawn(name)
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self.processes.values())
+
+    def stop(self):
+        self._stop.set()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+
+# ── HTTP API ─────────────────────────────────────────────────────────────────
+
+
+def _artifacts(job_dir: Path) -> list[dict]:
+    """Files a job produced, without manim's partial movies and temporaries."""
+    if not job_dir.is_dir():
+        return []
+    return [
+        {"path": path.relative_to(job_dir).as_posix(), "bytes": path.stat().st_size}
+        for path in sorted(job_dir.rglob("*"))
+        if path.is_file()
+        and "partial_movie_files" not in path.parts
+        and not path.name.startswith(".")
+    ]
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    server_version = "AutoManim/0.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str):
+        self._send_json(status, {"error": message})
+
+    def _route(self) -> tuple[list[str], dict]:
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        return parts, {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    def do_GET(self):
+        queue: JobQueue = self.server.queue
+        parts, query = self._route()
+        if parts == ["health"]:
+            self._send_json(
+                200,
+                {
+                    "workers": self.server.supervisor.alive(),
+                    "jobs": queue.counts(),
+                },
+            )
+        elif parts == ["jobs"]:
+            try:
+                limit = min(int(query.get("limit", 50)), 500)
+            except ValueError:
+                self._error(400, "limit must be an integer")
+                return
+            self._send_json(200, queue.jobs(query.get("status"), limit))
+        elif len(parts) >= 2 and parts[0] == "jobs":
+            job = queue.get(parts[1])
+            if job is None:
+                self._error(404, f"no job {parts[1]}")
+            elif len(parts) == 2:
+                self._send_json(200, job)
+            elif parts[2:] == ["events"]:
+                try:
+                    after = int(query.get("after", 0))
+                except ValueError:
+                    self._error(400, "after must be an integer")
+                    return
+                self._send_json(200, queue.events(job["id"], after))
+            elif parts[2:] == ["artifacts"]:
+                self._send_json(200, _artifacts(self.server.out_dir / job["id"]))
+            elif parts[2] == "artifacts":
+                self._send_file(self.server.out_dir / job["id"], parts[3:])
+            else:
+                self._error(404, f"unknown path {self.path}")
+        else:
+            self._error(404, f"unknown path {self.path}")
+
+    def _send_file(self, job_dir: Path, parts: list[str]):
+        root = job_dir.resolve()
+        path = root.joinpath(*parts).resolve()
+        if not path.is_relative_to(root) or not path.is_file():
+            self._error(404, "no such artifact")
+            return
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        )
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.send_header("Content-Disposition", f'attachment; filename="{path.name}"')
+        self.end_headers()
+        with path.open("rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            self._error(404, f"unknown path {self.path}")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._error(400, "body must be JSON")
+            return
+        if not isinstance(request, dict):
+            self._error(400, "body must be a JSON object")
+            return
+
+        prompt = request.get("prompt")
+        priority = request.get("priority", 0)
+        candidates = request.get("candidates", 1)
+        if not isinstance(prompt, str) or not prompt.strip():
+            self._error(400, "prompt is required")
+        elif len(prompt) > MAX_PROMPT_CHARS:
+            self._error(400, f"prompt is longer than {MAX_PROMPT_CHARS} characters")
+        elif not isinstance(priority, int) or isinstance(priority, bool):
+            self._error(400, "priority must be an integer")
+        elif (
+            not isinstance(candidates, int)
+            or isinstance(candidates, bool)
+            or candidates not in range(1, MAX_CANDIDATES + 1)
+        ):
+            self._error(400, f"candidates must be between 1 and {MAX_CANDIDATES}")
+        else:
+            job = self.server.queue.submit(prompt.strip(), priority, candidates)
+            self._send_json(201, job)
+
+    def do_DELETE(self):
+        queue: JobQueue = self.server.queue
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._error(404, f"unknown path {self.path}")
+        elif queue.get(parts[1]) is None:
+            self._error(404, f"no job {parts[1]}")
+        elif queue.cancel(parts[1]):
+            self._send_json(200, queue.get(parts[1]))
+        else:
+            self._error(409, "only queued jobs can be cancelled")
+
+
+def make_server(
+    queue: JobQueue,
+    supervisor: WorkerSupervisor,
+    out_dir: Path,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    verbose: bool = False,
+) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), APIHandler)
+    server.daemon_threads = True
+    server.queue = queue
+    server.supervisor = supervisor
+    server.out_dir = out_dir
+    server.verbose = verbose
+    return server
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run AutoManim as a local HTTP service."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help="job worker processes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=DEFAULT_DB,
+        help="SQLite job queue (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default=DEFAULT_OUT,
+        help="directory for per-job scripts and videos (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--artifacts",
+        metavar="LIST",
+        default=",".join(config.ARTIFACTS),
+        help="artifacts to build from each job's video in the background, e.g. "
+        "'poster,thumb,web=8M'",
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every HTTP request")
+    args = parser.parse_args(argv)
+    try:
+        automanim.parse_artifacts(args.artifacts)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main():
+    args = parse_args()
+    args.out.mkdir(parents=True, exist_ok=True)
+    queue = JobQueue(args.db)
+    requeued = queue.requeue()  # jobs interrupted by the last shutdown
+    supervisor = WorkerSupervisor(
+        queue, args.out.absolute(), max(1, args.workers), args.artifacts
+    )
+    supervisor.start()
+    server = make_server(
+        queue, supervisor, args.out.absolute(), args.host, args.port, args.verbose
+    )
+    print(
+        f"AutoManim server on http://{args.host}:{server.server_port} · "
+        f"{supervisor.count} workers · queue {args.db}"
+        + (f" · {requeued} jobs requeued" if requeued else ""),
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        supervisor.stop()
+        queue.requeue()
+
+
+if __name__ == "__main__":
+    main()